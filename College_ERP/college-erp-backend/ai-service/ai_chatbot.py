@@ -1,21 +1,122 @@
 import asyncio
 import json
+import os
+import re
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Any
+from transformers import TextStreamer
 from pathlib import Path
 
+from chat_session import ChatSession
+from context_builder import ContextBuilder
+from conversation_locks import ConversationLocks
+from conversation_store import ConversationStore, create_conversation_store, decode_cursor, encode_cursor, format_summary
+from generation_limits import GenerationLimits, GenerationStats, describe_sequence, stop_flags
+from inference_executor import (InferenceExecutor, continue_generation, default_inference_executor, generate_tokens,
+                                load_tokenizer, tensor_type)
+from kv_cache import KVCachePool
+from latency_stats import LatencyWindow
+from message_log import MessageLog, format_timestamp
+from micro_batcher import MicroBatcher
+from text_processing import tokenize
+
+# Longest reply kept from a model generation
+MAX_REPLY_CHARS = 500
+
+# Role markers that end the assistant's turn when the model starts writing the next one
+ROLE_MARKERS = ("User:", "Assistant:")
+
+
+def _cut_at_role_marker(text: str) -> str:
+    """Cut generated text where the model starts another turn"""
+    cuts = [text.find(marker) for marker in ROLE_MARKERS if marker in text]
+    return text[:min(cuts)] if cuts else text
+
+
+class _Prompt(NamedTuple):
+    """Token ids of one turn's prompt"""
+    conversation_id: str
+    token_ids: List[int]
+
+
+class _QueueStreamer(TextStreamer):
+    """Forward decoded text from the generation thread to an asyncio queue"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue = queue
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+
+class _EventStoppingCriteria:
+    """Stop generation once the consumer sets an event, e.g. after a client disconnect"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return stop_flags(input_ids, [self.event.is_set()] * len(input_ids))
+
+
 class AIChatbot:
-    def __init__(self):
+    def __init__(self, conversation_store: Optional[ConversationStore] = None, sweep_interval: float = 60.0,
+                 executor: Optional[InferenceExecutor] = None, max_batch: Optional[int] = None,
+                 max_batch_wait: Optional[float] = None):
         self.model_name = "microsoft/DialoGPT-medium"  # Lightweight conversational model
         self.tokenizer = None
         self.model = None
-        self.generator = None
-        self.conversations = {}  # In-memory storage for conversations
+        # Model calls run on the inference executor so generation never blocks the event loop
+        self.executor = executor if executor is not None else default_inference_executor()
+        
+        # Concurrent chat turns are gathered for up to max_batch_wait seconds into one generate call;
+        # CHAT_BATCH_MAX and CHAT_BATCH_WAIT_MS set the defaults, and a max batch of 1 turns batching off
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            max_batch=max_batch if max_batch is not None else int(os.getenv("CHAT_BATCH_MAX", "8")),
+            max_wait=max_batch_wait if max_batch_wait is not None else float(os.getenv("CHAT_BATCH_WAIT_MS", "5")) / 1000,
+            max_concurrency=self.executor.max_workers
+        )
+        # Attention caches kept between turns so a conversation's context is not prefilled again;
+        # KV_CACHE_MB bounds their memory
+        self.kv_cache = KVCachePool(max_bytes=int(float(os.getenv("KV_CACHE_MB", "256")) * 1024 * 1024))
+        # Prompts are assembled from per-message token ids within CHAT_CONTEXT_TOKENS; built with the tokenizer
+        self.context_tokens = int(os.getenv("CHAT_CONTEXT_TOKENS", "400"))
+        self.context: Optional[ContextBuilder] = None
+        
+        # Generation budget per endpoint: a reply stops at a role marker or the reply limit, after the
+        # endpoint's token cap, or once its wall-clock budget in seconds is spent; the batch and stream
+        # token caps default to CHAT_MAX_NEW_TOKENS
+        max_new_tokens = os.getenv("CHAT_MAX_NEW_TOKENS", "100")
+        self.generation_limits = {
+            endpoint: GenerationLimits(int(os.getenv(tokens_variable, max_new_tokens)), float(os.getenv(time_variable, max_time)),
+                                       stop_strings=ROLE_MARKERS, max_chars=MAX_REPLY_CHARS)
+            for endpoint, tokens_variable, time_variable, max_time in (
+                ("chat", "CHAT_MAX_NEW_TOKENS", "CHAT_MAX_TIME_S", "10"),
+                ("batch", "CHAT_BATCH_MAX_NEW_TOKENS", "CHAT_BATCH_MAX_TIME_S", "30"),
+                ("stream", "CHAT_STREAM_MAX_NEW_TOKENS", "CHAT_STREAM_MAX_TIME_S", "30")
+            )
+        }
+        self.generation_stats = {endpoint: GenerationStats() for endpoint in self.generation_limits}
+        # Bounded conversation storage, swept for idle conversations in the background
+        self.conversations = conversation_store if conversation_store is not None else create_conversation_store()
+        if self.conversations.compactor is not None:
+            self.conversations.compactor.intent_tagger = self._message_intents
+        self.sweep_interval = sweep_interval
+        self._sweep_task = None
         self.is_initialized = False
         
+        # Turns within one conversation run one at a time; different conversations run in parallel
+        self.conversation_locks = ConversationLocks()
+        
+        # Time from receiving a streamed request to sending its first text
+        self.first_token_latency = LatencyWindow()
+        
         # College-specific context and knowledge base
         self.college_context = {
             "courses": ["Computer Science", "Electronics", "Mechanical", "Civil", "Electrical"],
@@ -24,8 +125,33 @@ class AIChatbot:
             "services": ["Admission", "Examination", "Placement", "Library", "Transport"]
         }
         
-        # Initialize the model asynchronously
-        asyncio.create_task(self._initialize_model())
+        # Initialize the model asynchronously; without a running loop this waits for start_background_tasks()
+        self._init_task = None
+        try:
+            self._init_task = asyncio.get_running_loop().create_task(self._initialize_model())
+        except RuntimeError:
+            pass
+    
+    def start_background_tasks(self):
+        """Start loading the model if it was not started at construction, and the conversation sweeper"""
+        if self._init_task is None:
+            self._init_task = asyncio.create_task(self._initialize_model())
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self.conversations.run_sweeper(self.sweep_interval))
+    
+    async def stop_background_tasks(self):
+        """Stop the conversation sweeper and any model load still in progress, flush conversation writes and stop the inference workers"""
+        if self._init_task is not None and not self._init_task.done():
+            self._init_task.cancel()
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+        await self.conversations.flush_async()
+        await asyncio.to_thread(self.executor.shutdown, True)
     
     async def _initialize_model(self):
         """Initialize the AI model in the background"""
@@ -33,23 +159,18 @@ class AIChatbot:
             print("Initializing AI chatbot model...")
             
             # Use a lightweight model that doesn't require API keys
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            self.tokenizer = await asyncio.to_thread(load_tokenizer, self.model_name)
+            # With a process pool the model lives in the workers and self.model stays None
+            self.model = await self.executor.load_model(self.model_name)
             
             # Add padding token if it doesn't exist
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
-            # Create text generation pipeline
-            self.generator = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if torch.cuda.is_available() else -1,
-                max_length=512,
-                do_sample=True,
-                temperature=0.7,
-                pad_token_id=self.tokenizer.eos_token_id
+            self.context = ContextBuilder(
+                self.tokenizer.encode,
+                max_tokens=self.context_tokens,
+                rewrite_user=self._enhance_message_with_context
             )
             
             self.is_initialized = True
@@ -64,106 +185,324 @@ class AIChatbot:
         """Check if the AI model is ready"""
         return self.is_initialized
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics about the chatbot"""
+        return {
+            "conversations": self.conversations.stats(),
+            "conversation_locks": self.conversation_locks.stats(),
+            "model": self.model_name,
+            "model_ready": self.is_initialized,
+            "inference": self.executor.stats(),
+            "batching": self.batcher.stats(),
+            "kv_cache": self.kv_cache.stats(),
+            "context": self.context.stats() if self.context is not None else None,
+            "generation": {endpoint: stats.stats() for endpoint, stats in self.generation_stats.items()},
+            "time_to_first_token": self.first_token_latency.stats()
+        }
+    
     async def generate_response(self, message: str, user_id: Optional[str] = None, conversation_id: Optional[str] = None) -> Dict[str, Any]:
         """Generate AI response to user message"""
+        return await self.respond(await self._get_or_create_conversation(user_id, conversation_id), message)
+    
+    async def open_session(self, user_id: Optional[str] = None, conversation_id: Optional[str] = None) -> ChatSession:
+        """Bind a long-lived connection to a conversation"""
+        return ChatSession(self, await self._get_or_create_conversation(user_id, conversation_id))
+    
+    async def respond(self, conversation: Dict[str, Any], message: str) -> Dict[str, Any]:
+        """Run one chat turn in an already resolved conversation"""
+        async with self.conversation_locks.hold(conversation["id"]):
+            await self._add_user_message(conversation, message)
+            
+            # Generate response
+            if self.is_initialized:
+                try:
+                    response_text = await self._generate_ai_response(message, conversation["id"])
+                except Exception as e:
+                    print(f"Error generating AI response: {e}")
+                    response_text = self._generate_fallback_response(message)
+            else:
+                response_text = self._generate_fallback_response(message)
+            
+            return await self._finish_turn(conversation, response_text)
+    
+    async def stream_response(self, message: str, user_id: Optional[str] = None, conversation_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a response as stream events while the model generates it.
+        
+        Emits a ``start`` event, one ``token`` event per decoded chunk and a final ``done``
+        event once the reply has been written into the conversation.
+        """
+        started = time.perf_counter()
+        conversation = await self._get_or_create_conversation(user_id, conversation_id)
+        async with self.conversation_locks.hold(conversation["id"]):
+            await self._add_user_message(conversation, message)
+            yield {"type": "start", "conversation_id": conversation["id"]}
+            
+            response_text = ""
+            if self.is_initialized:
+                try:
+                    async for chunk in self._stream_ai_response(message, conversation["id"]):
+                        if not response_text:
+                            chunk = chunk.lstrip()
+                            if not chunk:
+                                continue
+                            self.first_token_latency.record(time.perf_counter() - started)
+                        response_text += chunk
+                        yield {"type": "token", "text": chunk}
+                except Exception as e:
+                    print(f"Error streaming AI response: {e}")
+            
+            # Nothing usable was generated, so the fallback arrives as a single chunk
+            if not response_text.strip():
+                response_text = self._generate_fallback_response(message)
+                self.first_token_latency.record(time.perf_counter() - started)
+                yield {"type": "token", "text": response_text}
+            
+            yield {"type": "done", **(await self._finish_turn(conversation, response_text.strip()))}
+    
+    async def generate_responses(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate responses for many messages, batching the model generations.
+        
+        Messages are processed in waves holding at most one message per conversation, so
+        a later message in the same conversation sees the earlier reply in its context.
+        Results come back in input order; a failing item yields an ``error`` entry.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        pending = list(range(len(requests)))
+        
+        while pending:
+            wave, deferred, seen = [], [], set()
+            for index in pending:
+                conversation_id = requests[index].get("conversation_id")
+                if conversation_id and conversation_id in seen:
+                    deferred.append(index)
+                else:
+                    seen.add(conversation_id)
+                    wave.append(index)
+            pending = deferred
+            
+            # Hold every conversation of the wave, so no other turn interleaves with it
+            wave_ids = [requests[index]["conversation_id"] for index in wave if requests[index].get("conversation_id")]
+            async with self.conversation_locks.hold_all(wave_ids):
+                conversations = {}
+                for index in wave:
+                    request = requests[index]
+                    try:
+                        conversations[index] = await self._get_or_create_conversation(request.get("user_id"), request.get("conversation_id"))
+                        await self._add_user_message(conversations[index], request["message"])
+                    except Exception as e:
+                        results[index] = {"error": f"Error generating chat response: {str(e)}"}
+                
+                wave = [index for index in wave if index in conversations]
+                replies: Dict[int, str] = {}
+                if self.is_initialized and wave:
+                    try:
+                        generated = await self._generate_ai_responses(
+                            [requests[index]["message"] for index in wave],
+                            [conversations[index]["id"] for index in wave]
+                        )
+                        replies = dict(zip(wave, generated))
+                    except Exception as e:
+                        print(f"Error generating batched AI responses: {e}")
+                
+                for index in wave:
+                    response_text = replies.get(index) or self._generate_fallback_response(requests[index]["message"])
+                    results[index] = await self._finish_turn(conversations[index], response_text)
+        
+        return results
+    
+    async def _get_or_create_conversation(self, user_id: Optional[str], conversation_id: Optional[str]) -> Dict[str, Any]:
+        """Look up a conversation, creating it if needed"""
         
         # Create conversation ID if not provided
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
         
-        # Initialize conversation if it doesn't exist
-        if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = {
-                "id": conversation_id,
-                "user_id": user_id,
-                "messages": [],
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
-        
-        # Add user message to conversation
-        self.conversations[conversation_id]["messages"].append({
-            "role": "user",
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Generate response
-        if self.is_initialized and self.generator:
-            try:
-                response_text = await self._generate_ai_response(message, conversation_id)
-            except Exception as e:
-                print(f"Error generating AI response: {e}")
-                response_text = self._generate_fallback_response(message)
-        else:
-            response_text = self._generate_fallback_response(message)
-        
-        # Add AI response to conversation
-        self.conversations[conversation_id]["messages"].append({
-            "role": "assistant",
-            "content": response_text,
-            "timestamp": datetime.now().isoformat()
-        })
+        return await self.conversations.get_or_create_async(conversation_id, user_id)
+    
+    async def _add_user_message(self, conversation: Dict[str, Any], message: str):
+        """Add user message to conversation"""
+        await self.conversations.append_message_async(conversation, "user", message)
+        if self.context is not None:
+            self.context.append(conversation["id"], conversation["messages"])
+    
+    async def _finish_turn(self, conversation: Dict[str, Any], response_text: str) -> Dict[str, Any]:
+        """Record the assistant's reply and build the API response"""
         
-        # Update conversation timestamp
-        self.conversations[conversation_id]["updated_at"] = datetime.now().isoformat()
+        # Add AI response to conversation; the store updates the conversation timestamp
+        message = await self.conversations.append_message_async(conversation, "assistant", response_text)
+        if self.context is not None:
+            self.context.append(conversation["id"], conversation["messages"])
         
         return {
             "response": response_text,
-            "conversation_id": conversation_id,
-            "timestamp": datetime.now().isoformat()
+            "conversation_id": conversation["id"],
+            "timestamp": message.timestamp
         }
     
+    def _extract_reply(self, generated_ids: Any) -> Optional[str]:
+        """Extract the assistant's reply from the tokens generated after the prompt"""
+        # Generation usually stops on a role marker, so the reply is what comes before the first one
+        reply = _cut_at_role_marker(self.tokenizer.decode(generated_ids, skip_special_tokens=True)).strip()
+        return reply[:MAX_REPLY_CHARS] or None
+    
+    async def _prepare_prompt(self, conversation_id: str) -> _Prompt:
+        """Assemble a turn's prompt from the conversation's context window"""
+        conversation = await self.conversations.get_async(conversation_id) or {}
+        return _Prompt(conversation_id, self.context.build(conversation_id, conversation.get("messages") or MessageLog()))
+    
     async def _generate_ai_response(self, message: str, conversation_id: str) -> str:
-        """Generate response using the AI model"""
+        """Generate response using the AI model, batched with other concurrent turns"""
         try:
-            # Get conversation context
-            conversation = self.conversations.get(conversation_id, {})
-            messages = conversation.get("messages", [])
-            
-            # Build context from recent messages
-            context = ""
-            recent_messages = messages[-6:]  # Last 6 messages for context
-            for msg in recent_messages:
-                if msg["role"] == "user":
-                    context += f"User: {msg['content']}\n"
-                else:
-                    context += f"Assistant: {msg['content']}\n"
-            
-            # Add college-specific context
-            enhanced_message = self._enhance_message_with_context(message)
-            
-            # Generate response using the model
-            inputs = self.tokenizer.encode(context + f"User: {enhanced_message}\nAssistant:", return_tensors="pt")
-            
-            # Generate response
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    inputs,
-                    max_length=inputs.shape[1] + 100,
-                    do_sample=True,
-                    temperature=0.7,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    num_return_sequences=1
-                )
-            
-            # Decode response
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            # Extract only the assistant's response
-            response_parts = response.split("Assistant:")
-            if len(response_parts) > 1:
-                ai_response = response_parts[-1].strip()
-                # Clean up the response
-                ai_response = ai_response.split("User:")[0].strip()
-                return ai_response[:500]  # Limit response length
-            else:
-                return self._generate_fallback_response(message)
+            reply = await self.batcher.submit(await self._prepare_prompt(conversation_id))
+            return reply or self._generate_fallback_response(message)
                 
         except Exception as e:
             print(f"Error in AI generation: {e}")
             return self._generate_fallback_response(message)
     
+    async def _stream_ai_response(self, message: str, conversation_id: str) -> AsyncIterator[str]:
+        """Run the model on the inference executor and yield reply text as it is decoded.
+        
+        Text is held back while it could still be the start of a role marker, and generation
+        stops as soon as a marker appears, the reply limit or the stream's budget is reached,
+        or the consumer goes away. A process pool cannot stream back, so the reply then arrives in one piece.
+        """
+        if not self.executor.in_process:
+            yield await self._generate_ai_response(message, conversation_id)
+            return
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        streamer = _QueueStreamer(self.tokenizer, loop, queue)
+        
+        prompt = await self._prepare_prompt(conversation_id)
+        generation = asyncio.ensure_future(self._generate_cached(
+            prompt,
+            self.generation_limits["stream"],
+            streamer=streamer,
+            stopping_criteria=[_EventStoppingCriteria(stop)]
+        ))
+        generation.add_done_callback(lambda _: queue.put_nowait(None))
+        holdback = max(len(marker) for marker in ROLE_MARKERS) - 1
+        text, emitted = "", 0
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                text += chunk
+                
+                cut = _cut_at_role_marker(text)
+                if len(cut) < len(text):
+                    text = cut
+                    break
+                if len(text) >= MAX_REPLY_CHARS:
+                    break
+                
+                safe = len(text) - holdback
+                if safe > emitted:
+                    yield text[emitted:safe]
+                    emitted = safe
+            
+            text = text[:MAX_REPLY_CHARS].rstrip()
+            if len(text) > emitted:
+                yield text[emitted:]
+        finally:
+            stop.set()
+            outputs = await generation
+            self._record_generation("stream", outputs[0][len(prompt.token_ids):], text)
+    
+    async def _generate_ai_responses(self, messages: List[str], conversation_ids: List[str]) -> List[str]:
+        """Generate responses for several prompts with a single batched model call"""
+        prompts = [await self._prepare_prompt(conversation_id) for conversation_id in conversation_ids]
+        replies = await self._generate_batch(prompts, endpoint="batch")
+        return [reply or self._generate_fallback_response(message) for message, reply in zip(messages, replies)]
+    
+    async def _generate_batch(self, prompts: List[_Prompt], endpoint: str = "chat") -> List[Optional[str]]:
+        """Run one generate call over several prompts, returning each extracted reply or None"""
+        limits = self.generation_limits[endpoint]
+        
+        # A turn generating alone continues its conversation's cached context
+        if len(prompts) == 1 and self.executor.in_process:
+            outputs = await self._generate_cached(prompts[0], limits)
+            generated_ids = outputs[0][len(prompts[0].token_ids):]
+            reply = self._extract_reply(generated_ids)
+            self._record_generation(endpoint, generated_ids, reply)
+            return [reply]
+        
+        # Batched prompts are prefilled in full, which leaves their cached contexts behind
+        for prompt in prompts:
+            self.kv_cache.discard(prompt.conversation_id)
+        
+        # Decoder-only models continue from the right, so prompts are padded on the left
+        self.tokenizer.padding_side = "left"
+        inputs = self.tokenizer.pad({"input_ids": [prompt.token_ids for prompt in prompts]}, return_tensors=tensor_type())
+        
+        outputs = await self.executor.run(
+            generate_tokens,
+            self.model_name,
+            inputs["input_ids"],
+            limits=limits,
+            attention_mask=inputs["attention_mask"],
+            do_sample=True,
+            temperature=0.7,
+            pad_token_id=self.tokenizer.eos_token_id,
+            num_return_sequences=1
+        )
+        
+        prompt_length = inputs["input_ids"].shape[1]
+        replies = []
+        for output in outputs:
+            reply = self._extract_reply(output[prompt_length:])
+            self._record_generation(endpoint, output[prompt_length:], reply)
+            replies.append(reply)
+        return replies
+    
+    def _record_generation(self, endpoint: str, generated_ids: Any, reply: Optional[str]):
+        """Account for the tokens one reply generated and how many of them it kept"""
+        limits = self.generation_limits[endpoint]
+        self.generation_stats[endpoint].record(describe_sequence(self.tokenizer, generated_ids.tolist(), reply or "", limits))
+    
+    async def _generate_cached(self, prompt: _Prompt, limits: GenerationLimits, **generate_kwargs) -> Any:
+        """Generate for one prompt on top of its conversation's cached context, then cache the prompt's context"""
+        
+        # The entry is taken out while generation extends it, so a failed turn leaves no stale cache.
+        # It stays usable while the context window only grows; a slid window starts a new one
+        entry = self.kv_cache.get(prompt.conversation_id)
+        past = None
+        if entry is None:
+            self.kv_cache.misses += 1
+        elif prompt.token_ids[:len(entry.token_ids)] == entry.token_ids:
+            self.kv_cache.hits += 1
+            past = entry.past
+            self.kv_cache.discard(prompt.conversation_id)
+        else:
+            self.kv_cache.invalidate(prompt.conversation_id)
+        
+        outputs, past, prefill_seconds, reused = await self.executor.run(
+            continue_generation,
+            self.model_name,
+            prompt.token_ids,
+            past,
+            limits,
+            do_sample=True,
+            temperature=0.7,
+            pad_token_id=self.tokenizer.eos_token_id,
+            **generate_kwargs
+        )
+        self.kv_cache.record_prefill(prefill_seconds, len(prompt.token_ids) - reused, reused)
+        self.kv_cache.put(prompt.conversation_id, prompt.token_ids, past)
+        return outputs
+    
+    def _message_intents(self, message: str) -> List[str]:
+        """List the college topics a message mentions, for conversation summaries"""
+        # Whole words only, and department codes such as "ME" only in capitals, so "fees" or "tell me" match nothing
+        words = f" {' '.join(tokenize(message))} "
+        codes = set(re.findall(r"[A-Za-z0-9]+", message))
+        return [topic for topic, names in self.college_context.items()
+                if any(name in codes if name.isupper() else f" {' '.join(tokenize(name))} " in words for name in names)]
+    
     def _enhance_message_with_context(self, message: str) -> str:
         """Enhance message with college-specific context"""
         message_lower = message.lower()
@@ -221,26 +560,34 @@ class AIChatbot:
         else:
             return "I understand you're asking about college-related matters. While I try my best to help, for specific or detailed queries, please contact the relevant department directly. Is there anything else I can help you with?"
     
-    async def get_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all conversations for a specific user"""
-        user_conversations = []
-        for conv_id, conv_data in self.conversations.items():
-            if conv_data.get("user_id") == user_id:
-                # Return conversation summary
-                summary = {
-                    "id": conv_id,
-                    "created_at": conv_data["created_at"],
-                    "updated_at": conv_data["updated_at"],
-                    "message_count": len(conv_data["messages"]),
-                    "preview": conv_data["messages"][0]["content"][:100] if conv_data["messages"] else ""
-                }
-                user_conversations.append(summary)
-        
-        return sorted(user_conversations, key=lambda x: x["updated_at"], reverse=True)
+    async def get_user_conversations(self, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of a user's conversations, most recently updated first"""
+        before = decode_cursor(cursor) if cursor else None
+        
+        # Summaries come from the store; fetch one extra to learn whether another page follows
+        page = await self.conversations.user_conversations_async(user_id, limit=limit + 1 if limit else None, before=before)
+        has_more = limit is not None and len(page) > limit
+        if has_more:
+            page = page[:limit]
+        
+        next_cursor = encode_cursor((page[-1]["updated_at"], page[-1]["id"])) if has_more else None
+        return {"conversations": [format_summary(summary) for summary in page], "next_cursor": next_cursor}
+    
+    async def search_conversations(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search a user's past messages, best matches first"""
+        results = await self.conversations.search_async(user_id, query, limit)
+        for result in results:
+            result["timestamp"] = format_timestamp(result["timestamp"])
+        return results
+    
+    def export_conversations(self, user_id: Optional[str] = None, since: Optional[int] = None,
+                             until: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream full conversations last updated within [since, until), as export records"""
+        return self.conversations.export(user_id, since, until)
     
     async def delete_conversation(self, conversation_id: str) -> bool:
         """Delete a specific conversation"""
-        if conversation_id in self.conversations:
-            del self.conversations[conversation_id]
-            return True
-        return False
\ No newline at end of file
+        self.kv_cache.discard(conversation_id)
+        if self.context is not None:
+            self.context.discard(conversation_id)
+        return await self.conversations.delete_async(conversation_id)
\ No newline at end of file
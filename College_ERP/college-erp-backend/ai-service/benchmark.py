@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for College ERP AI Service
+
+Usage: python benchmark.py [name ...]   (runs every benchmark when no name is given)
+
+Benchmarks that load a model only run when named; they use BENCHMARK_CHAT_MODEL
+(default microsoft/DialoGPT-medium).
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from conversation_store import InMemoryConversationStore
+from faq_retriever import FAQRetriever
+from intent_classifier import CentroidIntentClassifier
+from message_log import MessageLog, now_us
+from question_suggester import QuestionSuggester
+from spell_correction import DeletionIndex
+from sqlite_conversation_store import SQLiteConversationStore
+from text_processing import content_tokens
+
+def _percentile(samples, percent):
+    """Return the given percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+def _report_latency(label, samples_ms):
+    """Print mean/p50/p99 of latency samples in milliseconds"""
+    print(f"{label}: mean {statistics.mean(samples_ms):.4f} ms, "
+          f"p50 {_percentile(samples_ms, 50):.4f} ms, p99 {_percentile(samples_ms, 99):.4f} ms")
+
+def _synthetic_faq_entries(count, seed=7):
+    """Generate a synthetic FAQ corpus seeded from the shipped entries"""
+    rng = random.Random(seed)
+    base = FAQRetriever.from_file("data/faq.json").entries
+    vocabulary = sorted({word for entry in base for word in entry["answer"].lower().split()})
+    entries = []
+    for i in range(count):
+        source = base[i % len(base)]
+        extra = " ".join(rng.choice(vocabulary) for _ in range(12))
+        entries.append({
+            "id": f"synthetic-{i}",
+            "question": f"{source['question']} {rng.choice(vocabulary)}",
+            "answer": f"{source['answer']} {extra}"
+        })
+    return entries
+
+def benchmark_faq_retrieval(num_entries=10000, num_queries=2000):
+    """Benchmark BM25 index build and query latency"""
+    print("=" * 50)
+    print(f"FAQ retrieval (BM25) - {num_entries} entries")
+    print("=" * 50)
+
+    entries = _synthetic_faq_entries(num_entries)
+    start = time.perf_counter()
+    retriever = FAQRetriever(entries)
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.1f} ms, vocabulary {len(retriever.vocabulary)} terms")
+
+    queries = [entry["question"] for entry in random.Random(1).sample(entries, min(num_queries, len(entries)))]
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.best_match(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    _report_latency("Query latency", samples)
+
+def benchmark_intent_classifier(num_messages=20000):
+    """Benchmark single and batch centroid intent classification"""
+    print("=" * 50)
+    print(f"Centroid intent classifier - {num_messages} messages")
+    print("=" * 50)
+
+    classifier = CentroidIntentClassifier.from_file("data/intent_examples.json")
+    entries = _synthetic_faq_entries(num_messages)
+    messages = [entry["question"] for entry in entries]
+
+    samples = []
+    for message in messages[:2000]:
+        start = time.perf_counter()
+        classifier.classify(message)
+        samples.append((time.perf_counter() - start) * 1000)
+    _report_latency("Single message latency", samples)
+
+    start = time.perf_counter()
+    classifier.classify_batch(messages)
+    elapsed = time.perf_counter() - start
+    print(f"Batch classification: {elapsed * 1000:.1f} ms total, {num_messages / elapsed:.0f} messages/s")
+
+def benchmark_spell_index(num_keywords=500):
+    """Benchmark deletion index build, footprint and typo lookup latency"""
+    print("=" * 50)
+    print(f"Keyword typo index - {num_keywords} keywords")
+    print("=" * 50)
+
+    rng = random.Random(3)
+    vocabulary = sorted({word.strip(".,()").lower() for entry in FAQRetriever.from_file("data/faq.json").entries
+                         for word in entry["answer"].split() if len(word) >= 5})
+    keywords = vocabulary[:num_keywords]
+    index = DeletionIndex(keywords)
+    stats = index.stats()
+    print(f"Build: {stats['build_time_ms']} ms, {stats['deletion_entries']} entries, ~{stats['memory_bytes'] // 1024} KB")
+
+    typos = []
+    for word in rng.choices(keywords, k=2000):
+        position = rng.randrange(1, len(word))
+        typos.append(word[:position] + word[position + 1:])
+
+    for label, lookup in (("Uncached lookup", index._lookup), ("Cached lookup", index.lookup)):
+        samples = []
+        for typo in typos:
+            start = time.perf_counter()
+            lookup(typo)
+            samples.append((time.perf_counter() - start) * 1000)
+        _report_latency(label, samples)
+
+def benchmark_question_suggester(num_questions=50000, num_queries=20000):
+    """Benchmark autocomplete build time and per-keystroke latency"""
+    print("=" * 50)
+    print(f"Question autocomplete - {num_questions} questions")
+    print("=" * 50)
+
+    rng = random.Random(5)
+    entries = _synthetic_faq_entries(num_questions)
+    questions = [(f"{entry['question']} {i}", rng.random() * 100) for i, entry in enumerate(entries)]
+    start = time.perf_counter()
+    suggester = QuestionSuggester(questions)
+    print(f"Build: {(time.perf_counter() - start) * 1000:.1f} ms, {len(suggester.prefix_top)} precomputed prefixes")
+
+    # Simulate keystrokes: every prefix of randomly chosen questions
+    keystrokes = []
+    while len(keystrokes) < num_queries:
+        question = rng.choice(questions)[0]
+        keystrokes.extend(question[:length] for length in range(1, len(question) + 1))
+    samples = []
+    for prefix in keystrokes[:num_queries]:
+        start = time.perf_counter()
+        suggester.suggest(prefix)
+        samples.append((time.perf_counter() - start) * 1000)
+    _report_latency("Keystroke latency", samples)
+
+def benchmark_conversation_store(num_appends=50000, num_conversations=2000):
+    """Benchmark sustained message append throughput and read latency per store backend"""
+    print("=" * 50)
+    print(f"Conversation store - {num_appends} appends over {num_conversations} conversations")
+    print("=" * 50)
+
+    rng = random.Random(11)
+    messages = [entry["question"] for entry in _synthetic_faq_entries(500)]
+    directory = tempfile.mkdtemp()
+    stores = (
+        ("memory", InMemoryConversationStore()),
+        ("sqlite", SQLiteConversationStore(os.path.join(directory, "conversations.db")))
+    )
+    for label, store in stores:
+        start = time.perf_counter()
+        for i in range(num_appends):
+            conversation_id = f"conversation-{rng.randrange(num_conversations)}"
+            conversation = store.get_or_create(conversation_id, f"user-{hash(conversation_id) % 200}")
+            store.append_message(conversation, "user" if i % 2 == 0 else "assistant", rng.choice(messages))
+        store.flush()
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {num_appends / elapsed:.0f} appends/s sustained (including final flush)")
+
+        samples = []
+        for _ in range(2000):
+            conversation_id = f"conversation-{rng.randrange(num_conversations)}"
+            start = time.perf_counter()
+            store.get(conversation_id)
+            samples.append((time.perf_counter() - start) * 1000)
+        _report_latency(f"{label} read latency", samples)
+
+    sqlite_stats = stores[1][1].stats()
+    print(f"sqlite: {sqlite_stats['commits']} commits, {sqlite_stats['average_batch']} messages per commit")
+
+def benchmark_message_memory(num_messages=200000, per_conversation=20):
+    """Measure bytes per stored message: ISO-timestamped dicts versus columnar message logs"""
+    print("=" * 50)
+    print(f"Message memory - {num_messages} messages")
+    print("=" * 50)
+
+    rng = random.Random(13)
+    questions = [entry["question"] for entry in _synthetic_faq_entries(200)]
+    contents = [rng.choice(questions) for _ in range(num_messages)]
+    content_bytes = sum(sys.getsizeof(content) for content in contents)
+
+    def build_dicts():
+        conversations = [[] for _ in range(num_messages // per_conversation)]
+        for i, content in enumerate(contents):
+            conversations[i // per_conversation].append({
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": content,
+                "timestamp": datetime.now().isoformat()
+            })
+        return conversations
+
+    def build_logs():
+        conversations = [MessageLog() for _ in range(num_messages // per_conversation)]
+        for i, content in enumerate(contents):
+            conversations[i // per_conversation].append("user" if i % 2 == 0 else "assistant", content, now_us())
+        return conversations
+
+    for label, build in (("dict + ISO string", build_dicts), ("MessageLog", build_logs)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        conversations = build()
+        elapsed = time.perf_counter() - start
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label}: {allocated / num_messages:.1f} bytes/message excluding shared text "
+              f"(text adds {content_bytes / num_messages:.1f}), built in {elapsed * 1000:.0f} ms")
+        del conversations
+
+def benchmark_history_search(num_messages=5000, per_conversation=20, num_queries=1000):
+    """Benchmark full-text search latency over one user's chat history per store backend"""
+    print("=" * 50)
+    print(f"History search - one user with {num_messages} messages")
+    print("=" * 50)
+
+    rng = random.Random(17)
+    entries = _synthetic_faq_entries(500)
+    queries = [" ".join(rng.sample(content_tokens(rng.choice(entries)["question"]), 2)) for _ in range(num_queries)]
+    directory = tempfile.mkdtemp()
+    stores = (
+        ("memory", InMemoryConversationStore(max_per_user=num_messages)),
+        ("sqlite", SQLiteConversationStore(os.path.join(directory, "conversations.db")))
+    )
+    for label, store in stores:
+        for i in range(num_messages):
+            conversation = store.get_or_create(f"conversation-{i // per_conversation}", "student")
+            entry = rng.choice(entries)
+            store.append_message(conversation, "user" if i % 2 == 0 else "assistant",
+                                 entry["question"] if i % 2 == 0 else entry["answer"])
+        store.flush()
+
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search("student", query)
+            samples.append((time.perf_counter() - start) * 1000)
+        _report_latency(f"{label} query latency", samples)
+
+def benchmark_chat_batching(num_requests=64, max_batch=8):
+    """Compare chat generation throughput with micro-batching against one prompt per generate call"""
+    import asyncio
+    import torch
+    from ai_chatbot import AIChatbot
+
+    model_name = os.getenv("BENCHMARK_CHAT_MODEL", "microsoft/DialoGPT-medium")
+    print("=" * 50)
+    print(f"Chat batching - {num_requests} concurrent turns on {model_name}")
+    print("=" * 50)
+
+    rng = random.Random(19)
+    messages = [rng.choice(_synthetic_faq_entries(200))["question"] for _ in range(num_requests)]
+
+    async def run(batch_size):
+        chatbot = AIChatbot(conversation_store=InMemoryConversationStore(), max_batch=batch_size)
+        chatbot.model_name = model_name
+        await chatbot._initialize_model()
+        await chatbot._generate_ai_response("warm up", "warm-up")
+        torch.manual_seed(0)
+
+        async def turn(i):
+            start = time.perf_counter()
+            await chatbot.generate_response(messages[i], f"user-{i}", f"conversation-{i}")
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(turn(i) for i in range(num_requests)))
+        return time.perf_counter() - start, samples, chatbot.batcher.stats()["average_batch"]
+
+    for label, batch_size in (("batch=1", 1), (f"micro-batched (max {max_batch})", max_batch)):
+        elapsed, samples, average_batch = asyncio.run(run(batch_size))
+        print(f"{label}: {num_requests / elapsed:.2f} turns/s, average batch {average_batch}")
+        _report_latency(f"{label} turn latency", samples)
+
+# Fixed prompts whose greedy continuations are compared across quantization modes and backends
+DRIFT_PROMPTS = [
+    "User: When does the library open?\nAssistant:",
+    "User: How do I apply for admission to Computer Science?\nAssistant:",
+    "User: What is the fee for the hostel?\nAssistant:",
+    "User: When are the semester exams held?\nAssistant:",
+    "User: Which companies visit for placements?\nAssistant:",
+    "User: Is there a bus to the campus?\nAssistant:",
+    "Write a professional summary for a Mechanical student in semester 5.\n\nProfessional Summary:",
+    "Write a brief paragraph about these skills:\nSkills: Python, SQL, Git\n\nSkills overview:",
+]
+
+def _measure_generation(model_name, backend, quantization, cache_dir, max_new_tokens):
+    """Load a model in a fresh process and time greedy generation on the drift prompts"""
+    import resource
+
+    os.environ["MODEL_BACKEND"] = backend
+    os.environ["MODEL_QUANTIZATION"] = quantization
+    if cache_dir:
+        os.environ["MODEL_QUANTIZED_CACHE_DIR"] = cache_dir
+    start = time.perf_counter()
+    from inference_executor import generate_tokens, load_causal_lm, load_tokenizer, tensor_type
+    tokenizer = load_tokenizer(model_name)
+    load_causal_lm(model_name)
+    load_seconds = time.perf_counter() - start
+    settings = {"max_new_tokens": max_new_tokens, "min_new_tokens": max_new_tokens, "do_sample": False,
+                "pad_token_id": tokenizer.eos_token_id}
+
+    outputs, latencies = [], []
+    generate_tokens(model_name, tokenizer.encode(DRIFT_PROMPTS[0], return_tensors=tensor_type()), **settings)
+    for prompt in DRIFT_PROMPTS:
+        input_ids = tokenizer.encode(prompt, return_tensors=tensor_type())
+        start = time.perf_counter()
+        output = generate_tokens(model_name, input_ids, **settings)
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(output[0, input_ids.shape[1]:].tolist())
+
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    batch = tokenizer.pad({"input_ids": [tokenizer.encode(prompt) for prompt in DRIFT_PROMPTS]},
+                          return_tensors=tensor_type())
+    start = time.perf_counter()
+    generate_tokens(model_name, batch["input_ids"], attention_mask=batch["attention_mask"], **settings)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "load_seconds": load_seconds,
+        "latencies": latencies,
+        "tokens_per_second": len(DRIFT_PROMPTS) * max_new_tokens / batch_seconds,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "torch_imported": "torch" in sys.modules,
+        "outputs": outputs
+    }
+
+def _compare_generation(model_name, runs, max_new_tokens):
+    """Run each (label, backend, quantization, cache_dir) in its own process and report load, speed and memory"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    # Every run gets a fresh process so its load time and peak RSS are its own
+    for label, backend, quantization, cache_dir in runs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[label] = pool.submit(_measure_generation, model_name, backend, quantization, cache_dir,
+                                         max_new_tokens).result()
+
+    for label, result in results.items():
+        print(f"{label}: load {result['load_seconds']:.2f} s, {result['tokens_per_second']:.1f} tokens/s batched, "
+              f"peak RSS {result['rss_mb']:.0f} MB, torch imported: {result['torch_imported']}")
+        _report_latency(f"{label} latency per prompt", result["latencies"])
+        per_token = [latency / max_new_tokens for latency in result["latencies"]]
+        print(f"{label} latency per token: mean {statistics.mean(per_token):.2f} ms")
+    return results
+
+def _report_drift(label, reference, outputs):
+    """Print how far greedy continuations follow the reference ones"""
+    exact = sum(a == b for a, b in zip(reference, outputs))
+    agreement = []
+    for a, b in zip(reference, outputs):
+        prefix = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+        agreement.append(prefix / max(len(a), 1))
+    print(f"{label}: {exact}/{len(reference)} continuations identical, "
+          f"{statistics.mean(agreement) * 100:.1f}% of tokens before the first divergence on average")
+
+def benchmark_quantization(max_new_tokens=32):
+    """Compare fp32 and dynamic int8 inference: load time, latency, throughput, peak RSS and output drift"""
+    model_name = os.getenv("BENCHMARK_CHAT_MODEL", "microsoft/DialoGPT-medium")
+    print("=" * 50)
+    print(f"Quantization - {len(DRIFT_PROMPTS)} prompts x {max_new_tokens} tokens on {model_name}")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # The second int8 run reads the cached weights
+        results = _compare_generation(model_name, [
+            ("fp32", "torch", "none", None),
+            ("int8", "torch", "int8", cache_dir),
+            ("int8 (cached)", "torch", "int8", cache_dir)
+        ], max_new_tokens)
+    _report_drift("Output drift", results["fp32"]["outputs"], results["int8"]["outputs"])
+
+def benchmark_backends(max_new_tokens=32):
+    """Compare the torch and ONNX Runtime backends: startup, per-token latency, throughput, peak RSS and parity"""
+    from onnx_causal_lm import ensure_exported
+
+    model_name = os.getenv("BENCHMARK_CHAT_MODEL", "microsoft/DialoGPT-medium")
+    print("=" * 50)
+    print(f"Backends - {len(DRIFT_PROMPTS)} prompts x {max_new_tokens} tokens on {model_name}")
+    print("=" * 50)
+
+    # Exported up front (into ONNX_MODEL_DIR), as a deployment would, so the onnx runs time loading only
+    ensure_exported(model_name)
+    results = _compare_generation(model_name, [
+        ("torch fp32", "torch", "none", None),
+        ("onnx", "onnx", "none", None),
+        ("onnx (optimized graph saved)", "onnx", "none", None)
+    ], max_new_tokens)
+    _report_drift("ONNX parity with torch", results["torch fp32"]["outputs"], results["onnx"]["outputs"])
+
+BENCHMARKS = {
+    "faq": benchmark_faq_retrieval,
+    "intents": benchmark_intent_classifier,
+    "spelling": benchmark_spell_index,
+    "suggest": benchmark_question_suggester,
+    "store": benchmark_conversation_store,
+    "messages": benchmark_message_memory,
+    "search": benchmark_history_search,
+    "batching": benchmark_chat_batching,
+    "quantization": benchmark_quantization,
+    "backends": benchmark_backends,
+}
+
+# Benchmarks that need torch and a downloaded model
+MODEL_BENCHMARKS = {"batching", "quantization", "backends"}
+
+def main():
+    """Run the selected benchmarks"""
+    names = sys.argv[1:] or [name for name in BENCHMARKS if name not in MODEL_BENCHMARKS]
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return False
+        BENCHMARKS[name]()
+        print()
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
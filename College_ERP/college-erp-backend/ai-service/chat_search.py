@@ -0,0 +1,131 @@
+import heapq
+import math
+from typing import Any, Dict, List, Set, Tuple
+
+from text_processing import content_tokens, light_stem, tokenize_with_spans
+
+# Characters of context kept around the first matching word of a snippet
+SNIPPET_BEFORE = 40
+SNIPPET_AFTER = 120
+
+
+def analyze(text: str) -> List[str]:
+    """Turn text into index terms"""
+    return [light_stem(token) for token in content_tokens(text)]
+
+
+def make_snippet(content: str, terms: Set[str]) -> str:
+    """Cut a window of the message around its first word matching a query term"""
+    for token, start, _ in tokenize_with_spans(content):
+        if light_stem(token) in terms:
+            break
+    else:
+        start = 0
+
+    # Widen the window to whole words at both ends
+    begin = max(0, start - SNIPPET_BEFORE)
+    if begin:
+        begin = content.find(" ", begin) + 1 or begin
+    end = min(len(content), start + SNIPPET_AFTER)
+    if end < len(content):
+        boundary = content.rfind(" ", start, end)
+        end = boundary if boundary > start else end
+    return f"{'…' if begin else ''}{content[begin:end].strip()}{'…' if end < len(content) else ''}"
+
+
+class _UserIndex:
+    """Postings of one user's messages"""
+
+    __slots__ = ("postings", "doc_freq", "message_count")
+
+    def __init__(self):
+        # term -> conversation id -> message position -> term frequency
+        self.postings: Dict[str, Dict[str, Dict[int, int]]] = {}
+        self.doc_freq: Dict[str, int] = {}
+        self.message_count = 0
+
+
+class ChatHistoryIndex:
+    """Incremental inverted index over each user's chat messages.
+
+    Messages are added as they are appended and whole conversations are dropped
+    when deleted or evicted, so the index always mirrors what the store holds.
+    Postings are partitioned by user, which keeps a query's cost proportional to
+    the user's own history, and results are ranked with BM25 term saturation
+    over per-user document frequencies.
+    """
+
+    def __init__(self, k1: float = 1.2):
+        self.k1 = k1
+        self._users: Dict[str, _UserIndex] = {}
+        # Conversation id -> [owner, terms it contributed, messages it contributed]
+        self._conversations: Dict[str, list] = {}
+
+    def add_message(self, user_id: str, conversation_id: str, position: int, content: str):
+        """Index one message of a conversation"""
+        counts: Dict[str, int] = {}
+        for term in analyze(content):
+            counts[term] = counts.get(term, 0) + 1
+
+        index = self._users.get(user_id)
+        if index is None:
+            index = self._users[user_id] = _UserIndex()
+        index.message_count += 1
+
+        entry = self._conversations.setdefault(conversation_id, [user_id, set(), 0])
+        entry[2] += 1
+        terms = entry[1]
+        for term, count in counts.items():
+            index.postings.setdefault(term, {}).setdefault(conversation_id, {})[position] = count
+            index.doc_freq[term] = index.doc_freq.get(term, 0) + 1
+            terms.add(term)
+
+    def remove_conversation(self, conversation_id: str):
+        """Drop every posting of a conversation"""
+        entry = self._conversations.pop(conversation_id, None)
+        if entry is None:
+            return
+
+        user_id, terms, message_count = entry
+        index = self._users[user_id]
+        for term in terms:
+            positions = index.postings[term].pop(conversation_id)
+            index.doc_freq[term] -= len(positions)
+            if not index.postings[term]:
+                del index.postings[term]
+                del index.doc_freq[term]
+
+        index.message_count -= message_count
+        if not index.message_count:
+            del self._users[user_id]
+
+    def search(self, user_id: str, query: str, limit: int = 10) -> List[Tuple[float, str, int]]:
+        """Return ``(score, conversation id, message position)`` for the best matching messages"""
+        index = self._users.get(user_id)
+        if index is None:
+            return []
+
+        terms = set(analyze(query))
+        scores: Dict[Tuple[str, int], float] = {}
+        for term in terms:
+            conversations = index.postings.get(term)
+            if not conversations:
+                continue
+            doc_freq = index.doc_freq[term]
+            idf = math.log(1 + (index.message_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            for conversation_id, positions in conversations.items():
+                for position, count in positions.items():
+                    key = (conversation_id, position)
+                    scores[key] = scores.get(key, 0.0) + idf * count * (self.k1 + 1) / (count + self.k1)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(round(score, 4), conversation_id, position) for (conversation_id, position), score in best]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get statistics about the index"""
+        return {
+            "users": len(self._users),
+            "conversations": len(self._conversations),
+            "messages": sum(index.message_count for index in self._users.values()),
+            "terms": sum(len(index.postings) for index in self._users.values())
+        }
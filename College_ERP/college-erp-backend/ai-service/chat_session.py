@@ -0,0 +1,22 @@
+from typing import Any, Dict
+
+
+class ChatSession:
+    """A conversation bound to one long-lived connection such as a WebSocket.
+
+    The conversation record is resolved once when the session opens and kept
+    resident, so each turn goes straight to the chatbot without re-validating a
+    request model or looking the conversation up again.
+    """
+
+    def __init__(self, chatbot: Any, conversation: Dict[str, Any]):
+        self.chatbot = chatbot
+        self.conversation = conversation
+
+    @property
+    def conversation_id(self) -> str:
+        return self.conversation["id"]
+
+    async def send(self, message: str) -> Dict[str, Any]:
+        """Run one chat turn in this session's conversation"""
+        return await self.chatbot.respond(self.conversation, message)
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from conversation_compaction import SUMMARY_ROLE, total_messages
+from message_log import MessageLog
+
+# Share of the budget a window is cut back to when it overflows, so it then grows for several turns
+SLIDE_TO = 0.5
+
+
+class _Window:
+    """Token ids of the messages in one conversation's context window, oldest first"""
+
+    __slots__ = ("segments", "roles", "tokens", "covered")
+
+    def __init__(self):
+        self.segments: List[List[int]] = []
+        self.roles: List[str] = []
+        self.tokens = 0
+        # Messages of the conversation accounted for, including those that fell out of the window
+        self.covered = 0
+
+    def add(self, role: str, token_ids: List[int]):
+        """Add the newest message's token ids"""
+        self.segments.append(token_ids)
+        self.roles.append(role)
+        self.tokens += len(token_ids)
+
+
+class ContextBuilder:
+    """Assembles model prompts from token ids cached per message, under a token budget.
+
+    Each message is tokenized once, when it is appended, as a ``User: ...`` or
+    ``Assistant: ...`` line. A prompt is the window of recent lines followed by
+    ``Assistant:`` and is at most ``max_tokens`` long. The window only grows
+    until it would overflow; then it is rebuilt newest first from whole turns
+    filling half the budget. Between slides every prompt extends the previous
+    one, which is what lets a conversation's attention cache be reused.
+
+    A conversation the builder has not seen, or whose history changed behind
+    its back, is tokenized again from the stored messages, newest first, only
+    as far back as the budget reaches. ``rewrite_user`` adapts user messages
+    before tokenizing, e.g. to add college context.
+    """
+
+    def __init__(self, encode: Callable[[str], List[int]], max_tokens: int = 400, max_conversations: int = 1000,
+                 rewrite_user: Optional[Callable[[str], str]] = None):
+        self.encode = encode
+        self.max_tokens = max_tokens
+        self.max_conversations = max_conversations
+        self.rewrite_user = rewrite_user
+        self.assistant_tag = encode("Assistant:")
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+
+        self.messages_encoded = 0
+        self.tokens_encoded = 0
+        self.reseeds = 0
+        self.slides = 0
+
+    def append(self, conversation_id: str, messages: MessageLog):
+        """Tokenize the message just appended to a conversation's log"""
+        window = self._windows.get(conversation_id)
+        if window is None or window.covered != total_messages(messages) - 1:
+            self._reseed(conversation_id, messages)
+            return
+        self._windows.move_to_end(conversation_id)
+        message = messages[-1]
+        window.add(message.role, self._encode_message(message.role, message.content))
+        window.covered += 1
+
+    def build(self, conversation_id: str, messages: MessageLog) -> List[int]:
+        """Return the prompt token ids for a conversation whose last message is the user's turn"""
+        window = self._windows.get(conversation_id)
+        if window is None or window.covered != total_messages(messages):
+            window = self._reseed(conversation_id, messages)
+        else:
+            self._windows.move_to_end(conversation_id)
+
+        if window.tokens + len(self.assistant_tag) > self.max_tokens:
+            self._slide(window)
+
+        prompt: List[int] = []
+        for segment in window.segments:
+            prompt.extend(segment)
+        prompt.extend(self.assistant_tag)
+        return prompt
+
+    def discard(self, conversation_id: str):
+        """Forget a conversation's window"""
+        self._windows.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get window counts and tokenization work"""
+        return {
+            "conversations": len(self._windows),
+            "max_tokens": self.max_tokens,
+            "messages_encoded": self.messages_encoded,
+            "tokens_encoded": self.tokens_encoded,
+            "reseeds": self.reseeds,
+            "slides": self.slides
+        }
+
+    def _encode_message(self, role: str, content: str) -> List[int]:
+        """Tokenize one message as a line of the prompt"""
+        if role == "user":
+            if self.rewrite_user is not None:
+                content = self.rewrite_user(content)
+            token_ids = self.encode(f"User: {content}\n")
+        else:
+            # The tag is tokenized on its own, so a prompt ending in it is a prefix of the next one
+            token_ids = self.assistant_tag + self.encode(f" {content}\n")
+        self.messages_encoded += 1
+        self.tokens_encoded += len(token_ids)
+        return token_ids
+
+    def _reseed(self, conversation_id: str, messages: MessageLog) -> _Window:
+        """Tokenize a conversation's recent messages, newest first, until the budget is spent"""
+        budget = self.max_tokens - len(self.assistant_tag)
+        newest: List[Tuple[str, List[int]]] = []
+        tokens = 0
+        for index in range(len(messages) - 1, -1, -1):
+            message = messages[index]
+            if message.role == SUMMARY_ROLE:
+                break
+            token_ids = self._encode_message(message.role, message.content)
+            if newest and tokens + len(token_ids) > budget:
+                break
+            newest.append((message.role, token_ids))
+            tokens += len(token_ids)
+
+        window = _Window()
+        for role, token_ids in reversed(newest):
+            window.add(role, token_ids)
+        window.covered = total_messages(messages)
+        self._trim(window, budget)
+
+        self._windows[conversation_id] = window
+        self._windows.move_to_end(conversation_id)
+        while len(self._windows) > self.max_conversations:
+            self._windows.popitem(last=False)
+        self.reseeds += 1
+        return window
+
+    def _slide(self, window: _Window):
+        """Cut an overflowing window back to its newest whole turns"""
+        budget = self.max_tokens - len(self.assistant_tag)
+        target = int(budget * SLIDE_TO)
+        # The newest message, the user's turn, always stays even when it alone is over the target
+        start, tokens = len(window.segments) - 1, 0
+        for index in range(len(window.segments) - 1, -1, -1):
+            tokens += len(window.segments[index])
+            if tokens > target:
+                break
+            if window.roles[index] == "user":
+                start = index
+
+        del window.segments[:start]
+        del window.roles[:start]
+        window.tokens = sum(map(len, window.segments))
+        self._trim(window, budget)
+        self.slides += 1
+
+    def _trim(self, window: _Window, budget: int):
+        """Keep only the end of a window made of a single message longer than the budget"""
+        while window.tokens > budget and len(window.segments) > 1:
+            window.tokens -= len(window.segments.pop(0))
+            window.roles.pop(0)
+        if window.tokens > budget:
+            window.segments[0] = window.segments[0][-budget:]
+            window.tokens = len(window.segments[0])
@@ -0,0 +1,125 @@
+import json
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from message_log import ROLE_CODES, MessageLog
+from text_processing import content_tokens
+
+SUMMARY_ROLE = "summary"
+
+# Most frequent intents and keywords kept in a summary record
+SUMMARY_TOP_ITEMS = 10
+
+
+def read_summary(messages: MessageLog) -> Optional[Dict[str, Any]]:
+    """Return the summary record heading a compacted log, or None"""
+    if messages and messages.roles[0] == ROLE_CODES[SUMMARY_ROLE]:
+        return json.loads(messages.contents[0])
+    return None
+
+
+def total_messages(messages: MessageLog) -> int:
+    """Count the messages of a conversation, including those folded into its summary"""
+    summary = read_summary(messages)
+    return len(messages) if summary is None else len(messages) - 1 + summary["messages"]
+
+
+def conversation_preview(messages: MessageLog) -> str:
+    """Preview of the first message of a conversation, even after it has been folded"""
+    summary = read_summary(messages)
+    if summary is not None:
+        return summary["preview"]
+    return messages.contents[0][:100] if messages else ""
+
+
+class ConversationCompactor:
+    """Rolling compaction policy that bounds the history kept per conversation.
+
+    Once a log holds more than ``max_messages`` messages or ``max_bytes`` of text,
+    everything but the last ``keep_recent`` messages is folded into one summary
+    record at the head of the log: message counts per role, the time span, the
+    preview of the first message, and the most frequent intents and keywords of
+    the user's messages. The tail starts on a user message and stays verbatim.
+    Compacting again merges the previous summary into the new one.
+
+    ``intent_tagger`` maps a message to the intents it expresses; the chatbot
+    that owns the store supplies it.
+    """
+
+    def __init__(self, max_messages: int = 40, max_bytes: int = 32 * 1024, keep_recent: int = 12,
+                 intent_tagger: Optional[Callable[[str], Iterable[str]]] = None):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.keep_recent = keep_recent
+        self.intent_tagger = intent_tagger
+        self.compactions = 0
+        self.messages_folded = 0
+
+    def should_compact(self, messages: MessageLog) -> bool:
+        """Check whether a log has outgrown the policy"""
+        if len(messages) <= self.keep_recent + 1:
+            return False
+        return len(messages) > self.max_messages or sum(map(len, messages.contents)) > self.max_bytes
+
+    def compact(self, messages: MessageLog, keep_recent: Optional[int] = None) -> int:
+        """Fold all but (at least) the last ``keep_recent`` messages into the summary record.
+
+        Returns how many messages were folded.
+        """
+        keep = max(self.keep_recent if keep_recent is None else keep_recent, 1)
+        summary = read_summary(messages)
+        start = 0 if summary is None else 1
+
+        # Fold whole turns: the tail is widened back to the question of its first reply
+        split = len(messages) - keep
+        while split > start and messages.roles[split] != ROLE_CODES["user"]:
+            split -= 1
+        if split <= start:
+            return 0
+
+        folded = messages[start:split]
+        tail = messages[split:]
+        summary = self._merge(summary, folded)
+
+        messages.clear()
+        messages.append(SUMMARY_ROLE, json.dumps(summary, separators=(",", ":")), folded[-1].timestamp_us)
+        for message in tail:
+            messages.append(*message)
+
+        self.compactions += 1
+        self.messages_folded += len(folded)
+        return len(folded)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get compaction activity"""
+        return {
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes,
+            "keep_recent": self.keep_recent,
+            "compactions": self.compactions,
+            "messages_folded": self.messages_folded
+        }
+
+    def _merge(self, summary: Optional[Dict[str, Any]], folded) -> Dict[str, Any]:
+        """Combine a previous summary with newly folded messages"""
+        summary = summary or {
+            "messages": 0, "roles": {}, "first_at": folded[0].timestamp_us, "last_at": 0,
+            "preview": folded[0].content[:100], "intents": {}, "keywords": {}
+        }
+        roles = Counter(summary["roles"])
+        intents = Counter(summary["intents"])
+        keywords = Counter(summary["keywords"])
+        for message in folded:
+            roles[message.role] += 1
+            if message.role != "user":
+                continue
+            keywords.update(content_tokens(message.content))
+            if self.intent_tagger is not None:
+                intents.update(set(self.intent_tagger(message.content)))
+
+        summary["messages"] += len(folded)
+        summary["roles"] = dict(roles)
+        summary["last_at"] = folded[-1].timestamp_us
+        summary["intents"] = dict(intents.most_common(SUMMARY_TOP_ITEMS))
+        summary["keywords"] = dict(keywords.most_common(SUMMARY_TOP_ITEMS))
+        return summary
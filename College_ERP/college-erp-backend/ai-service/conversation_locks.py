@@ -0,0 +1,61 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable
+
+from latency_stats import LatencyWindow
+
+
+class ConversationLocks:
+    """Per-conversation asyncio locks that keep the turns of one conversation in order.
+
+    A lock exists only while some turn holds or waits for it and is dropped when
+    the last one leaves, so memory follows the number of active conversations.
+    Turns in different conversations never share a lock and run fully in
+    parallel. The time spent waiting for each lock is recorded.
+    """
+
+    def __init__(self):
+        # Conversation id -> [lock, turns holding or waiting for it]
+        self._locks: Dict[str, list] = {}
+        self.wait_time = LatencyWindow()
+        self.acquisitions = 0
+        self.contended = 0
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: str) -> AsyncIterator[None]:
+        """Hold a conversation's lock for the duration of the block"""
+        entry = self._locks.get(conversation_id)
+        if entry is None:
+            entry = self._locks[conversation_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            lock = entry[0]
+            if lock.locked():
+                self.contended += 1
+            started = time.perf_counter()
+            async with lock:
+                self.wait_time.record(time.perf_counter() - started)
+                self.acquisitions += 1
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[conversation_id]
+
+    @asynccontextmanager
+    async def hold_all(self, conversation_ids: Iterable[str]) -> AsyncIterator[None]:
+        """Hold several conversations' locks at once, acquired in sorted order to rule out deadlocks"""
+        async with AsyncExitStack() as stack:
+            for conversation_id in sorted(set(conversation_ids)):
+                await stack.enter_async_context(self.hold(conversation_id))
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        """Get lock activity and wait times"""
+        return {
+            "active": len(self._locks),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait": self.wait_time.stats()
+        }
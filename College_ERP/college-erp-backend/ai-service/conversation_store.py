@@ -0,0 +1,473 @@
+import asyncio
+import base64
+import bisect
+import json
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from array import array
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from chat_search import ChatHistoryIndex, analyze, make_snippet
+from conversation_compaction import SUMMARY_ROLE, ConversationCompactor, conversation_preview, total_messages
+from message_log import ROLE_CODES, MessageLog, MessageRecord, format_timestamp, now_us
+
+# Approximate fixed cost of a conversation record and of one message, measured from the
+# objects actually created; message content is added on top
+_SAMPLE_TIMESTAMP = now_us()
+CONVERSATION_OVERHEAD_BYTES = (
+    sys.getsizeof({"id": "", "user_id": "", "messages": None, "created_at": 0, "updated_at": 0})
+    + sys.getsizeof(MessageLog()) + MessageLog().nbytes()
+    + 2 * sys.getsizeof(_SAMPLE_TIMESTAMP) + sys.getsizeof("0" * 36)
+)
+MESSAGE_OVERHEAD_BYTES = array("b").itemsize + array("q").itemsize + 8  # role code, timestamp, list slot
+
+
+# Conversations exported between yields to the event loop
+EXPORT_PAGE_SIZE = 200
+
+# Position of a conversation in a user's listing: (updated_at in epoch microseconds, conversation id)
+ListingKey = Tuple[int, str]
+
+
+def encode_cursor(key: ListingKey) -> str:
+    """Encode a listing position as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(f"{key[0]}\n{key[1]}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> ListingKey:
+    """Decode a pagination cursor, raising ValueError if it is malformed"""
+    try:
+        updated_at, conversation_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("\n")
+        return int(updated_at), conversation_id
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def summarize_conversation(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the listing summary of a conversation, with timestamps still in epoch microseconds"""
+    messages = conversation["messages"]
+    return {
+        "id": conversation["id"],
+        "created_at": conversation["created_at"],
+        "updated_at": conversation["updated_at"],
+        "message_count": total_messages(messages),
+        "preview": conversation_preview(messages)
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Format a listing summary's timestamps as ISO-8601 strings for the API"""
+    return {
+        **summary,
+        "created_at": format_timestamp(summary["created_at"]),
+        "updated_at": format_timestamp(summary["updated_at"])
+    }
+
+
+def export_record(conversation_id: str, user_id: Optional[str], created_at: int, updated_at: int,
+                  messages) -> Dict[str, Any]:
+    """Build the export form of a full conversation, with ISO-8601 timestamps"""
+    records = [
+        {"role": role, "content": content, "timestamp": format_timestamp(timestamp_us)}
+        for role, content, timestamp_us in messages
+    ]
+    message_count = len(records)
+    if records and records[0]["role"] == SUMMARY_ROLE:
+        message_count += json.loads(records[0]["content"])["messages"] - 1
+    return {
+        "id": conversation_id,
+        "user_id": user_id,
+        "created_at": format_timestamp(created_at),
+        "updated_at": format_timestamp(updated_at),
+        "message_count": message_count,
+        "messages": records
+    }
+
+
+class ConversationStore(ABC):
+    """Storage backend for chat conversations.
+
+    Conversations are dicts shaped like ``{"id", "user_id", "messages", "created_at",
+    "updated_at"}`` where ``messages`` is a ``MessageLog`` and timestamps are integer
+    epoch microseconds. Chatbots only read and write them through this interface, so
+    backends can bound memory or persist conversations without touching chat code.
+
+    A store with a ``compactor`` folds the older turns of long conversations into a
+    summary record at the head of ``messages``; message counts and previews keep
+    covering the folded messages.
+
+    Code running on the event loop uses the ``*_async`` variants. They default to
+    the synchronous methods, which suits stores that never block; stores that do
+    I/O or wait on other threads override them.
+    """
+
+    compactor: Optional[ConversationCompactor] = None
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Return a conversation, or None if it does not exist"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_or_create(self, conversation_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        """Return a conversation, creating it if needed"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_message(self, conversation: Dict[str, Any], role: str, content: str) -> MessageRecord:
+        """Append a message to a conversation and return the stored message"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> bool:
+        """Delete a conversation, returning whether it existed"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_conversations(self, user_id: str, limit: Optional[int] = None,
+                           before: Optional[ListingKey] = None) -> List[Dict[str, Any]]:
+        """Return summaries of a user's conversations, most recently updated first.
+
+        ``before`` resumes a listing after the conversation with that listing key.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Return a user's best matching messages as ranked snippets, timestamps in epoch microseconds"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def export(self, user_id: Optional[str] = None, since: Optional[int] = None,
+                     until: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield export records of full conversations last updated within ``[since, until)``.
+
+        Conversations are produced a page at a time, yielding to the event loop in
+        between, so memory stays flat and concurrent chat traffic keeps running.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Make every accepted write durable; a no-op for stores that write synchronously"""
+
+    async def get_async(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """``get`` without blocking the event loop"""
+        return self.get(conversation_id)
+
+    async def get_or_create_async(self, conversation_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        """``get_or_create`` without blocking the event loop"""
+        return self.get_or_create(conversation_id, user_id)
+
+    async def append_message_async(self, conversation: Dict[str, Any], role: str, content: str) -> MessageRecord:
+        """``append_message`` without blocking the event loop"""
+        return self.append_message(conversation, role, content)
+
+    async def delete_async(self, conversation_id: str) -> bool:
+        """``delete`` without blocking the event loop"""
+        return self.delete(conversation_id)
+
+    async def user_conversations_async(self, user_id: str, limit: Optional[int] = None,
+                                       before: Optional[ListingKey] = None) -> List[Dict[str, Any]]:
+        """``user_conversations`` without blocking the event loop"""
+        return self.user_conversations(user_id, limit, before)
+
+    async def search_async(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """``search`` without blocking the event loop"""
+        return self.search(user_id, query, limit)
+
+    async def flush_async(self):
+        """``flush`` without blocking the event loop"""
+        self.flush()
+
+    def sweep(self) -> int:
+        """Evict expired conversations, returning how many were removed"""
+        return 0
+
+    async def run_sweeper(self, interval: float = 60.0):
+        """Periodically sweep expired conversations"""
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.sweep()
+            if evicted:
+                print(f"Conversation sweeper evicted {evicted} idle conversations")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get statistics about the store"""
+        return {}
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Bounded in-process conversation store with LRU eviction and an idle TTL.
+
+    Conversations are kept in least-recently-used order. Going over ``max_bytes``
+    evicts the least recently used conversations, a user opening more than
+    ``max_per_user`` conversations evicts that user's least recently updated one, and
+    the sweeper drops conversations idle for longer than ``idle_ttl`` seconds.
+    Memory is tracked as an estimate updated on every write.
+
+    Each user also has a secondary index of ``(updated_at, id)`` keys kept sorted
+    on every write, so listing a page of a user's conversations costs
+    O(log n + page size) regardless of how many conversations the process holds.
+    Messages are also fed to a full-text ``ChatHistoryIndex`` as they are appended
+    and dropped from it with their conversation. Compaction discards the folded
+    messages, so they also leave the search index.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, idle_ttl: float = 24 * 3600.0,
+                 max_per_user: int = 50, compactor: Optional[ConversationCompactor] = None):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.max_per_user = max_per_user
+        self.compactor = compactor
+
+        # Conversation id -> (conversation, last access in monotonic seconds), in LRU order
+        self._conversations: "OrderedDict[str, list]" = OrderedDict()
+        self._user_conversations: Dict[str, List[ListingKey]] = {}
+        self._sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.evictions = {"memory": 0, "idle": 0, "per_user": 0}
+        self.search_index = ChatHistoryIndex()
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            return None
+        self._touch(conversation_id, entry)
+        return entry[0]
+
+    def get_or_create(self, conversation_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        conversation = self.get(conversation_id)
+        if conversation is None:
+            now = now_us()
+            conversation = {
+                "id": conversation_id,
+                "user_id": user_id,
+                "messages": MessageLog(),
+                "created_at": now,
+                "updated_at": now
+            }
+            self._admit(conversation)
+        return conversation
+
+    def append_message(self, conversation: Dict[str, Any], role: str, content: str) -> MessageRecord:
+        message = conversation["messages"].append(role, content, now_us())
+        previous_key = (conversation["updated_at"], conversation["id"])
+        conversation["updated_at"] = message.timestamp_us
+
+        conversation_id = conversation["id"]
+        entry = self._conversations.get(conversation_id)
+        if entry is None or entry[0] is not conversation:
+            # Evicted or deleted while a caller (e.g. an open WebSocket) still held it
+            self._admit(conversation)
+        else:
+            self._touch(conversation_id, entry)
+            self._reindex(conversation, previous_key)
+            user_id = conversation["user_id"]
+            if user_id is not None:
+                self.search_index.add_message(user_id, conversation_id, len(conversation["messages"]) - 1, content)
+            size = MESSAGE_OVERHEAD_BYTES + sys.getsizeof(content)
+            self._sizes[conversation_id] += size
+            self.total_bytes += size
+            if self.compactor is not None and self.compactor.should_compact(conversation["messages"]):
+                self._compact(conversation)
+            self._enforce_memory_limit()
+        return message
+
+    def delete(self, conversation_id: str) -> bool:
+        return self._remove(conversation_id) is not None
+
+    def user_conversations(self, user_id: str, limit: Optional[int] = None,
+                           before: Optional[ListingKey] = None) -> List[Dict[str, Any]]:
+        keys = self._user_conversations.get(user_id, ())
+        end = bisect.bisect_left(keys, before) if before is not None else len(keys)
+        start = max(0, end - limit) if limit is not None else 0
+        return [summarize_conversation(self._conversations[conversation_id][0])
+                for _, conversation_id in reversed(keys[start:end])]
+
+    def search(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        terms = set(analyze(query))
+        results = []
+        for score, conversation_id, position in self.search_index.search(user_id, query, limit):
+            message = self._conversations[conversation_id][0]["messages"][position]
+            results.append({
+                "conversation_id": conversation_id,
+                "role": message.role,
+                "timestamp": message.timestamp_us,
+                "snippet": make_snippet(message.content, terms),
+                "score": score
+            })
+        return results
+
+    async def export(self, user_id: Optional[str] = None, since: Optional[int] = None,
+                     until: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        # Only conversation ids are snapshotted; conversations evicted meanwhile are skipped
+        if user_id is not None:
+            conversation_ids = [conversation_id for _, conversation_id in self._user_conversations.get(user_id, ())]
+        else:
+            conversation_ids = list(self._conversations)
+
+        for start in range(0, len(conversation_ids), EXPORT_PAGE_SIZE):
+            for conversation_id in conversation_ids[start:start + EXPORT_PAGE_SIZE]:
+                entry = self._conversations.get(conversation_id)
+                if entry is None:
+                    continue
+                conversation = entry[0]
+                if (since is not None and conversation["updated_at"] < since) or \
+                        (until is not None and conversation["updated_at"] >= until):
+                    continue
+                yield export_record(conversation_id, conversation["user_id"], conversation["created_at"],
+                                    conversation["updated_at"], conversation["messages"])
+            await asyncio.sleep(0)
+
+    def sweep(self) -> int:
+        """Evict conversations idle for longer than the TTL, oldest first"""
+        deadline = time.monotonic() - self.idle_ttl
+        evicted = 0
+        while self._conversations:
+            conversation_id, (_, last_access) = next(iter(self._conversations.items()))
+            if last_access > deadline:
+                break
+            self._remove(conversation_id)
+            self.evictions["idle"] += 1
+            evicted += 1
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "conversations": len(self._conversations),
+            "users": len(self._user_conversations),
+            "estimated_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.evictions),
+            "compaction": self.compactor.stats() if self.compactor else None,
+            "search_index": self.search_index.stats()
+        }
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def _touch(self, conversation_id: str, entry: list):
+        """Mark a conversation as most recently used"""
+        entry[1] = time.monotonic()
+        self._conversations.move_to_end(conversation_id)
+
+    def _reindex(self, conversation: Dict[str, Any], previous_key: ListingKey):
+        """Move a conversation to its new position in the owner's listing index"""
+        user_id = conversation["user_id"]
+        if user_id is None:
+            return
+        keys = self._user_conversations[user_id]
+        del keys[bisect.bisect_left(keys, previous_key)]
+        bisect.insort(keys, (conversation["updated_at"], conversation["id"]))
+
+    def _admit(self, conversation: Dict[str, Any]):
+        """Insert a conversation, making room for it under the per-user and memory limits"""
+        conversation_id = conversation["id"]
+        self._remove(conversation_id)
+
+        user_id = conversation["user_id"]
+        if user_id is not None:
+            keys = self._user_conversations.get(user_id)
+            while keys and len(keys) >= self.max_per_user:
+                self._remove(keys[0][1])
+                self.evictions["per_user"] += 1
+            bisect.insort(self._user_conversations.setdefault(user_id, []), (conversation["updated_at"], conversation_id))
+
+        size = self._estimate_size(conversation)
+        self._conversations[conversation_id] = [conversation, time.monotonic()]
+        self._index_messages(conversation)
+        self._sizes[conversation_id] = size
+        self.total_bytes += size
+        self._enforce_memory_limit()
+
+    def _compact(self, conversation: Dict[str, Any]):
+        """Fold a conversation's older turns into its summary, re-indexing the messages that remain"""
+        conversation_id = conversation["id"]
+        self.compactor.compact(conversation["messages"])
+        self.search_index.remove_conversation(conversation_id)
+        self._index_messages(conversation)
+        size = self._estimate_size(conversation)
+        self.total_bytes += size - self._sizes[conversation_id]
+        self._sizes[conversation_id] = size
+
+    def _index_messages(self, conversation: Dict[str, Any]):
+        """Add every message of a conversation to the search index, except a summary record"""
+        user_id = conversation["user_id"]
+        if user_id is None:
+            return
+        messages = conversation["messages"]
+        summary_code = ROLE_CODES[SUMMARY_ROLE]
+        for position, (code, content) in enumerate(zip(messages.roles, messages.contents)):
+            if code != summary_code:
+                self.search_index.add_message(user_id, conversation["id"], position, content)
+
+    def _estimate_size(self, conversation: Dict[str, Any]) -> int:
+        """Estimate the memory held by a conversation"""
+        return CONVERSATION_OVERHEAD_BYTES + sum(
+            MESSAGE_OVERHEAD_BYTES + sys.getsizeof(content) for content in conversation["messages"].contents
+        )
+
+    def _enforce_memory_limit(self):
+        """Evict least recently used conversations until the estimate fits the cap"""
+        while self.total_bytes > self.max_bytes and len(self._conversations) > 1:
+            self._remove(next(iter(self._conversations)))
+            self.evictions["memory"] += 1
+
+    def _remove(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Drop a conversation and its bookkeeping"""
+        entry = self._conversations.pop(conversation_id, None)
+        if entry is None:
+            return None
+
+        self.total_bytes -= self._sizes.pop(conversation_id)
+        self.search_index.remove_conversation(conversation_id)
+        conversation = entry[0]
+        user_id = conversation["user_id"]
+        if user_id is not None:
+            keys = self._user_conversations[user_id]
+            del keys[bisect.bisect_left(keys, (conversation["updated_at"], conversation_id))]
+            if not keys:
+                del self._user_conversations[user_id]
+        return conversation
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the conversation store configured through environment variables.
+
+    CONVERSATION_STORE=sqlite selects the durable SQLite store shared by worker
+    processes; anything else keeps conversations in process memory. Conversations
+    are compacted past CONVERSATION_COMPACT_MESSAGES messages or CONVERSATION_COMPACT_KB
+    of text, keeping the last CONVERSATION_KEEP_RECENT verbatim; 0 messages disables it.
+    """
+    compactor = None
+    if int(os.getenv("CONVERSATION_COMPACT_MESSAGES", "40")) > 0:
+        compactor = ConversationCompactor(
+            max_messages=int(os.getenv("CONVERSATION_COMPACT_MESSAGES", "40")),
+            max_bytes=int(float(os.getenv("CONVERSATION_COMPACT_KB", "32")) * 1024),
+            keep_recent=int(os.getenv("CONVERSATION_KEEP_RECENT", "12"))
+        )
+
+    if os.getenv("CONVERSATION_STORE", "memory") == "sqlite":
+        from sqlite_conversation_store import SQLiteConversationStore
+        return SQLiteConversationStore(
+            os.getenv("CONVERSATION_DB_PATH", str(Path(__file__).parent / "conversations.db")),
+            flush_interval=float(os.getenv("CONVERSATION_FLUSH_MS", "20")) / 1000,
+            max_queue=int(os.getenv("CONVERSATION_WRITE_QUEUE", "10000")),
+            compactor=compactor
+        )
+
+    return InMemoryConversationStore(
+        max_bytes=int(float(os.getenv("CONVERSATION_STORE_MAX_MB", "64")) * 1024 * 1024),
+        idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", str(24 * 3600))),
+        max_per_user=int(os.getenv("CONVERSATION_MAX_PER_USER", "50")),
+        compactor=compactor
+    )
@@ -0,0 +1,137 @@
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from text_processing import content_tokens, light_stem
+
+
+class FAQRetriever:
+    """BM25 retrieval over a FAQ corpus backed by a NumPy inverted index.
+
+    Postings are stored in CSR layout (``indptr``/``doc_ids``/``weights``) with
+    the full BM25 term weight precomputed per posting at build time. A query is
+    therefore one vectorized scatter-add per query term followed by an argmax,
+    which keeps lookups well under a millisecond at tens of thousands of entries.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75, min_matched_terms: int = 2):
+        self.entries = entries
+        self.k1 = k1
+        self.b = b
+        # Entries sharing fewer query terms than this get zero confidence, so one generic word never decides
+        self.min_matched_terms = min_matched_terms
+        self.vocabulary: Dict[str, int] = {}
+        self._build_index()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "FAQRetriever":
+        """Load a FAQ corpus from a JSON file with an ``entries`` list"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("entries", []), **kwargs)
+
+    @staticmethod
+    def _analyze(text: str) -> List[str]:
+        """Turn text into index terms"""
+        return [light_stem(token) for token in content_tokens(text)]
+
+    def _build_index(self):
+        """Build the CSR postings and precomputed BM25 weights"""
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        doc_lengths = np.zeros(len(self.entries), dtype=np.float32)
+
+        for doc_id, entry in enumerate(self.entries):
+            # Questions are indexed alongside answers; keywords are optional extras
+            text = f"{entry.get('question', '')} {entry.get('answer', '')} {' '.join(entry.get('keywords', []))}"
+            terms = self._analyze(text)
+            doc_lengths[doc_id] = len(terms)
+
+            counts: Dict[int, int] = {}
+            for term in terms:
+                term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            for term_id, count in counts.items():
+                term_ids.append(term_id)
+                doc_ids.append(doc_id)
+                term_freqs.append(count)
+
+        num_docs = max(len(self.entries), 1)
+        term_ids_array = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids_array, kind="stable")
+
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        tf = np.asarray(term_freqs, dtype=np.float32)[order]
+        postings_per_term = np.bincount(term_ids_array, minlength=len(self.vocabulary))
+        doc_freqs = postings_per_term.astype(np.float32)
+
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(postings_per_term, out=self.indptr[1:])
+
+        self.idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        # idf assigned to query terms that never occur in the corpus
+        self.unseen_idf = float(np.log1p((num_docs + 0.5) / 0.5))
+
+        average_length = float(doc_lengths.mean()) if len(self.entries) else 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths[self.doc_ids] / max(average_length, 1.0))
+        posting_terms = term_ids_array[order]
+        self.weights = (self.idf[posting_terms] * tf * (self.k1 + 1) / (tf + length_norm)).astype(np.float32)
+
+    def search(self, query: str, top_k: int = 1) -> List[Dict[str, Any]]:
+        """Return the ``top_k`` best scoring entries with their BM25 score and confidence.
+
+        Confidence is the BM25 score relative to the score of an average length
+        entry holding every query term once (the query's total idf), clamped to
+        [0, 1]. Query terms missing from the corpus count against it, and entries
+        sharing fewer than ``min_matched_terms`` query terms get zero.
+        """
+        terms = set(self._analyze(query))
+        if not terms or not self.entries:
+            return []
+
+        scores = np.zeros(len(self.entries), dtype=np.float32)
+        matched_terms = np.zeros(len(self.entries), dtype=np.int32)
+        ideal_score = 0.0
+        for term in terms:
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                ideal_score += self.unseen_idf
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            postings = self.doc_ids[start:end]
+            scores[postings] += self.weights[start:end]
+            matched_terms[postings] += 1
+            ideal_score += float(self.idf[term_id])
+
+        if top_k == 1:
+            best = np.array([int(np.argmax(scores))])
+        else:
+            top_k = min(top_k, len(self.entries))
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            best = candidates[np.argsort(-scores[candidates])]
+
+        results = []
+        for doc_id in best:
+            score = float(scores[doc_id])
+            if score <= 0:
+                break
+            entry = self.entries[doc_id]
+            confidence = 0.0
+            if matched_terms[doc_id] >= self.min_matched_terms and ideal_score > 0:
+                confidence = min(max(score / ideal_score, 0.0), 1.0)
+            results.append({
+                "id": entry.get("id"),
+                "question": entry.get("question"),
+                "answer": entry.get("answer"),
+                "category": entry.get("category"),
+                "score": score,
+                "confidence": confidence
+            })
+        return results
+
+    def best_match(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return the single best scoring entry, if any"""
+        results = self.search(query, top_k=1)
+        return results[0] if results else None
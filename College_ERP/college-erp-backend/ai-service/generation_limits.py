@@ -0,0 +1,151 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+SENTENCE_END = re.compile(r"[.!?]+")
+
+
+class GenerationLimits:
+    """Budget of one kind of generation: token and wall-clock caps plus text stop conditions.
+
+    Generation stops as soon as the text generated so far contains one of
+    ``stop_strings``, holds ``max_sentences`` sentences or reaches
+    ``max_chars`` characters; zero or empty disables a condition. ``max_time``
+    is in seconds.
+    """
+
+    def __init__(self, max_new_tokens: int, max_time: Optional[float] = None, stop_strings: Sequence[str] = (),
+                 max_sentences: int = 0, max_chars: int = 0):
+        self.max_new_tokens = max_new_tokens
+        self.max_time = max_time
+        self.stop_strings = tuple(stop_strings)
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+
+    @property
+    def checks_text(self) -> bool:
+        """Whether any stop condition needs the decoded text"""
+        return bool(self.stop_strings or self.max_sentences or self.max_chars)
+
+    def stop_reason(self, text: str) -> Optional[str]:
+        """Name the text condition the generated text meets, or None"""
+        if any(marker in text for marker in self.stop_strings):
+            return "stop_string"
+        if self.max_sentences and len(SENTENCE_END.findall(text)) >= self.max_sentences:
+            return "sentences"
+        if self.max_chars and len(text) >= self.max_chars:
+            return "chars"
+        return None
+
+    def generate_kwargs(self, tokenizer: Any, prompt_length: int, generate_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Add these limits to the keyword arguments of a ``generate`` call"""
+        kwargs = dict(generate_kwargs, max_new_tokens=self.max_new_tokens)
+        if self.max_time:
+            kwargs["max_time"] = self.max_time
+        if self.checks_text:
+            criteria = list(generate_kwargs.get("stopping_criteria") or [])
+            criteria.append(TextStoppingCriteria(tokenizer, prompt_length, self))
+            kwargs["stopping_criteria"] = criteria
+        return kwargs
+
+
+def first_sentences(text: str, count: int) -> str:
+    """Cut text after its ``count``-th sentence"""
+    for number, match in enumerate(SENTENCE_END.finditer(text), start=1):
+        if number == count:
+            return text[:match.end()]
+    return text
+
+
+def stop_flags(input_ids: Any, done: List[bool]) -> Any:
+    """Per-sequence stop flags as the array type of ``input_ids``, a torch tensor or a numpy array"""
+    if isinstance(input_ids, np.ndarray):
+        return np.array(done, dtype=bool)
+    import torch
+    return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class TextStoppingCriteria:
+    """Stop each sequence once its generated text meets a text condition of its limits.
+
+    A stopping criterion for transformers' ``generate`` as well as the ONNX
+    runtime's; it does not subclass transformers' base so that importing it
+    does not pull in torch.
+    """
+
+    def __init__(self, tokenizer: Any, prompt_length: int, limits: GenerationLimits):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.limits = limits
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = [
+            self.limits.stop_reason(self.tokenizer.decode(row[self.prompt_length:], skip_special_tokens=True)) is not None
+            for row in input_ids
+        ]
+        return stop_flags(input_ids, done)
+
+
+class GeneratedSequence(NamedTuple):
+    """What one generated sequence produced and how much of it was kept"""
+    generated_tokens: int
+    kept_tokens: int
+    reason: str
+
+
+class GenerationStats:
+    """Tokens generated and thrown away per endpoint, and why generation stopped"""
+
+    def __init__(self):
+        self.requests = 0
+        self.generated_tokens = 0
+        self.wasted_tokens = 0
+        self.reasons: Counter = Counter()
+
+    def record(self, sequence: GeneratedSequence):
+        """Account for one generated sequence"""
+        self.requests += 1
+        self.generated_tokens += sequence.generated_tokens
+        self.wasted_tokens += max(0, sequence.generated_tokens - sequence.kept_tokens)
+        self.reasons[sequence.reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get token totals, wasted tokens per request and stop reasons"""
+        return {
+            "requests": self.requests,
+            "generated_tokens": self.generated_tokens,
+            "wasted_tokens": self.wasted_tokens,
+            "wasted_per_request": round(self.wasted_tokens / self.requests, 2) if self.requests else 0.0,
+            "stop_reasons": dict(self.reasons)
+        }
+
+
+def describe_sequence(tokenizer: Any, token_ids: Sequence[int], kept_text: str, limits: GenerationLimits) -> GeneratedSequence:
+    """Measure a generated sequence (without its prompt) against the text that was kept from it"""
+    token_ids = list(token_ids)
+    eos = tokenizer.eos_token_id
+    # Sequences that finished early are padded with end-of-sequence tokens, which are not generated work
+    ended = eos is not None and eos in token_ids
+    if ended:
+        token_ids = token_ids[:token_ids.index(eos) + 1]
+    reason = limits.stop_reason(tokenizer.decode(token_ids, skip_special_tokens=True))
+    if reason is None:
+        if ended:
+            reason = "eos"
+        else:
+            reason = "max_new_tokens" if len(token_ids) >= limits.max_new_tokens else "max_time"
+    return GeneratedSequence(len(token_ids), _tokens_covering(tokenizer, token_ids, len(kept_text.strip())), reason)
+
+
+def _tokens_covering(tokenizer: Any, token_ids: Sequence[int], length: int) -> int:
+    """Fewest leading tokens whose decoded text, stripped, is ``length`` characters long"""
+    low, high = 0, len(token_ids)
+    while low < high:
+        middle = (low + high) // 2
+        if len(tokenizer.decode(token_ids[:middle], skip_special_tokens=True).strip()) >= length:
+            high = middle
+        else:
+            low = middle + 1
+    return low
@@ -0,0 +1,257 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from latency_stats import LatencyWindow
+from model_quantization import QUANTIZATION_MODES, load_int8_causal_lm
+
+MODEL_BACKENDS = ("torch", "onnx")
+
+# Models (by name and variant) and tokenizers loaded in this process; each pool process keeps its own
+_models: Dict[Tuple[str, str], Any] = {}
+_tokenizers: Dict[str, Any] = {}
+
+# Intra-op threads of a pool process, set by its initializer
+_worker_threads = 0
+
+
+def model_backend() -> str:
+    """Runtime that runs the models: ``torch`` (default) or ``onnx``, from MODEL_BACKEND"""
+    backend = os.getenv("MODEL_BACKEND", "torch")
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend!r}")
+    return backend
+
+
+def tensor_type() -> str:
+    """The ``return_tensors`` value the current backend's models accept"""
+    return "np" if model_backend() == "onnx" else "pt"
+
+
+def load_causal_lm(model_name: str, quantization: Optional[str] = None) -> Any:
+    """Load a causal language model once per process and return it.
+
+    With the onnx backend this is an ``OnnxCausalLM``, exported on first use.
+    Otherwise ``quantization`` is ``none`` or ``int8`` and defaults to
+    MODEL_QUANTIZATION; int8 weights are cached under MODEL_QUANTIZED_CACHE_DIR
+    when it is set.
+    """
+    if model_backend() == "onnx":
+        model = _models.get((model_name, "onnx"))
+        if model is None:
+            from onnx_causal_lm import OnnxCausalLM, ensure_exported
+            model = _models[(model_name, "onnx")] = OnnxCausalLM(ensure_exported(model_name), _worker_threads)
+        return model
+
+    quantization = quantization or os.getenv("MODEL_QUANTIZATION", "none")
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown model quantization: {quantization!r}")
+    model = _models.get((model_name, quantization))
+    if model is None:
+        if quantization == "int8":
+            model = load_int8_causal_lm(model_name, os.getenv("MODEL_QUANTIZED_CACHE_DIR") or None)
+        else:
+            from transformers import AutoModelForCausalLM
+            model = AutoModelForCausalLM.from_pretrained(model_name)
+            model.eval()
+        _models[(model_name, quantization)] = model
+    return model
+
+
+def load_tokenizer(model_name: str) -> Any:
+    """Load a model's tokenizer once per process and return it"""
+    tokenizer = _tokenizers.get(model_name)
+    if tokenizer is None:
+        if model_backend() == "onnx":
+            from onnx_causal_lm import OnnxTokenizer, ensure_exported
+            tokenizer = OnnxTokenizer(ensure_exported(model_name))
+        else:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+        _tokenizers[model_name] = tokenizer
+    return tokenizer
+
+
+def warm_up(model_name: str) -> None:
+    """Load a model in a pool process without sending it back"""
+    load_causal_lm(model_name)
+
+
+def generate_tokens(model_name: str, input_ids: Any, limits: Any = None, **generate_kwargs) -> Any:
+    """Run ``generate`` on a loaded model and return the output token ids.
+
+    ``limits`` is a ``GenerationLimits`` whose stop conditions are checked in
+    the process that generates.
+    """
+    if limits is not None:
+        generate_kwargs = limits.generate_kwargs(load_tokenizer(model_name), input_ids.shape[1], generate_kwargs)
+    model = load_causal_lm(model_name)
+    if model_backend() == "onnx":
+        return model.generate(input_ids, **generate_kwargs)
+    import torch
+    with torch.no_grad():
+        return model.generate(input_ids, **generate_kwargs)
+
+
+def continue_generation(model_name: str, token_ids: List[int], past: Any, limits: Any = None,
+                        **generate_kwargs) -> Tuple[Any, Any, float, int]:
+    """Prefill the prompt tokens missing from ``past``, generate, and cut ``past`` back to the prompt.
+
+    ``past`` holds the cached keys/values of a prefix of ``token_ids``, or is
+    None. Returns the output token ids, the prompt's keys/values, the prefill
+    time and how many prompt tokens came from the cache. The caller keeps the
+    cache between turns, so this needs the thread backend.
+    """
+    if limits is not None:
+        generate_kwargs = limits.generate_kwargs(load_tokenizer(model_name), len(token_ids), generate_kwargs)
+    model = load_causal_lm(model_name)
+    if model_backend() == "onnx":
+        return model.continue_generation(token_ids, past, **generate_kwargs)
+
+    import torch
+    from transformers import DynamicCache
+    reused = past.get_seq_length() if past is not None else 0
+    if reused >= len(token_ids):
+        past, reused = None, 0
+    if past is None:
+        past = DynamicCache()
+
+    with torch.no_grad():
+        # The last prompt token is left for generate, which needs at least one uncached token
+        started = time.perf_counter()
+        if len(token_ids) - 1 > reused:
+            model(torch.tensor([token_ids[reused:-1]]), past_key_values=past, use_cache=True)
+        prefill_seconds = time.perf_counter() - started
+
+        outputs = model.generate(
+            torch.tensor([token_ids]),
+            attention_mask=torch.ones((1, len(token_ids)), dtype=torch.long),
+            past_key_values=past,
+            **generate_kwargs
+        )
+
+    excess = past.get_seq_length() - len(token_ids)
+    if excess > 0:
+        past.crop(-excess)
+    return outputs, past, prefill_seconds, reused
+
+
+def _init_worker(threads: int):
+    """Limit a pool process's intra-op threads so workers do not oversubscribe the CPU"""
+    global _worker_threads
+    _worker_threads = threads
+    if threads > 0 and model_backend() == "torch":
+        import torch
+        torch.set_num_threads(threads)
+
+
+def _timed_call(function: Callable, args: tuple, kwargs: Dict[str, Any]) -> Tuple[Any, float, float]:
+    """Run a call in the pool, returning its result with its wall-clock start and duration"""
+    started = time.time()
+    begin = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, started, time.perf_counter() - begin
+
+
+class InferenceExecutor:
+    """Runs blocking model calls off the event loop and returns awaitable results.
+
+    The ``thread`` backend shares models with the serving process and is what
+    streaming generation needs; the ``process`` backend runs calls in spawned
+    worker processes, each loading its own copy of a model on first use, so
+    generation also escapes the GIL. Calls queue when every worker is busy, and
+    the time spent queued and executing is recorded. Functions sent to a
+    process pool must be importable module-level functions.
+    """
+
+    def __init__(self, backend: str = "thread", max_workers: int = 1, threads_per_worker: int = 0):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown inference backend: {backend!r}")
+        self.backend = backend
+        self.max_workers = max_workers
+        if backend == "thread":
+            self._pool: Executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads_per_worker,)
+            )
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_wait = LatencyWindow()
+        self.execution_time = LatencyWindow()
+
+    @property
+    def in_process(self) -> bool:
+        """Whether calls run in this process and can share its objects, e.g. a streamer"""
+        return self.backend == "thread"
+
+    async def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Run ``function(*args, **kwargs)`` on the pool and wait for its result"""
+        submitted = time.time()
+        future = self._pool.submit(_timed_call, function, args, kwargs)
+        self.submitted += 1
+        future.add_done_callback(lambda done: self._record(done, submitted))
+        result, _, _ = await asyncio.wrap_future(future)
+        return result
+
+    async def load_model(self, model_name: str) -> Optional[Any]:
+        """Load a model off the event loop; returns it when it lives in this process, else None"""
+        if self.in_process:
+            return await self.run(load_causal_lm, model_name)
+        await self.run(warm_up, model_name)
+        return None
+
+    def _record(self, future: Future, submitted: float):
+        """Account for a finished call; runs on whichever thread completed it"""
+        self.completed += 1
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+            return
+        _, started, elapsed = future.result()
+        self.queue_wait.record(max(0.0, started - submitted))
+        self.execution_time.record(elapsed)
+
+    def shutdown(self, wait: bool = False):
+        """Stop the workers, dropping calls that have not started; ``wait`` blocks until they exit"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and execution statistics"""
+        in_flight = self.submitted - self.completed
+        return {
+            "backend": self.backend,
+            "workers": self.max_workers,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.max_workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_wait": self.queue_wait.stats(),
+            "execution": self.execution_time.stats()
+        }
+
+
+_default_executor: Optional[InferenceExecutor] = None
+
+
+def default_inference_executor() -> InferenceExecutor:
+    """Return the executor shared by every model in this process, building it on first use.
+
+    INFERENCE_BACKEND selects ``thread`` (default) or ``process``, INFERENCE_WORKERS the
+    pool size and INFERENCE_THREADS the intra-op threads of each process worker.
+    """
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = InferenceExecutor(
+            backend=os.getenv("INFERENCE_BACKEND", "thread"),
+            max_workers=int(os.getenv("INFERENCE_WORKERS", "1")),
+            threads_per_worker=int(os.getenv("INFERENCE_THREADS", "0"))
+        )
+    return _default_executor
@@ -0,0 +1,110 @@
+import json
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from text_processing import content_tokens, tokenize
+
+# Intent reported, with zero similarity, by a classifier built without any example utterances
+UNKNOWN_INTENT = "unknown"
+
+
+class HashedNgramEmbedder:
+    """Cheap local text embeddings from hashed word and character n-grams.
+
+    Each message is mapped into a fixed number of buckets with CRC32 (stable across
+    processes, unlike ``hash``), weighted sublinearly and L2-normalized, so no
+    vocabulary or model download is needed.
+    """
+
+    def __init__(self, dimensions: int = 2048, char_ngram_range: Tuple[int, int] = (3, 5)):
+        self.dimensions = dimensions
+        self.char_ngram_range = char_ngram_range
+
+        # Words repeat heavily across messages, so their hashed buckets are memoized
+        self._word_buckets = lru_cache(maxsize=65536)(self._hash_word)
+
+    def _hash_word(self, word: str) -> np.ndarray:
+        """Return the hashed buckets of a word and its character n-grams"""
+        min_n, max_n = self.char_ngram_range
+        features = [f"w:{word}"]
+        padded = f"<{word}>"
+        for n in range(min_n, max_n + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return np.array([zlib.crc32(feature.encode("utf-8")) % self.dimensions for feature in features], dtype=np.int64)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text as an L2-normalized vector"""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed many texts into an L2-normalized ``(len(texts), dimensions)`` matrix"""
+        bucket_arrays: List[np.ndarray] = []
+        features_per_text: List[int] = []
+        for text in texts:
+            feature_count = 0
+            # Stop words only add noise shared by every intent, unless they are all there is
+            for word in content_tokens(text) or tokenize(text):
+                word_buckets = self._word_buckets(word)
+                bucket_arrays.append(word_buckets)
+                feature_count += len(word_buckets)
+            features_per_text.append(feature_count)
+
+        buckets = np.concatenate(bucket_arrays) if bucket_arrays else np.zeros(0, dtype=np.int64)
+        flat_index = np.repeat(np.arange(len(texts), dtype=np.int64) * self.dimensions, features_per_text) + buckets
+        counts = np.bincount(flat_index, minlength=len(texts) * self.dimensions)
+        matrix = np.log1p(counts.reshape(len(texts), self.dimensions).astype(np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class CentroidIntentClassifier:
+    """Intent classifier that compares message embeddings against per-intent centroids.
+
+    Centroids are the mean embedding of each intent's labeled example utterances,
+    re-normalized and stacked into a ``(num_intents, dimensions)`` matrix once at
+    build time. Classifying a message is a single matrix-vector product giving the
+    cosine similarity to every intent. Without any example utterances every
+    message is classified as ``UNKNOWN_INTENT`` with similarity 0.0.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]], embedder: Optional[HashedNgramEmbedder] = None):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.intents = [intent for intent, utterances in examples.items() if utterances]
+
+        centroids = np.zeros((len(self.intents), self.embedder.dimensions), dtype=np.float32)
+        for row, intent in enumerate(self.intents):
+            centroids[row] = self.embedder.embed_batch(examples[intent]).mean(axis=0)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.maximum(norms, 1e-12)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "CentroidIntentClassifier":
+        """Load labeled example utterances from a JSON file with an ``intents`` mapping"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("intents", {}), **kwargs)
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """Return the best matching intent and its similarity"""
+        if not self.intents:
+            return UNKNOWN_INTENT, 0.0
+        similarities = self.centroids @ self.embedder.embed(message)
+        best = int(np.argmax(similarities))
+        return self.intents[best], float(similarities[best])
+
+    def classify_batch(self, messages: List[str], chunk_size: int = 1024) -> List[Tuple[str, float]]:
+        """Classify many messages, one matrix product per chunk"""
+        if not self.intents:
+            return [(UNKNOWN_INTENT, 0.0)] * len(messages)
+        results: List[Tuple[str, float]] = []
+        for start in range(0, len(messages), chunk_size):
+            embeddings = self.embedder.embed_batch(messages[start:start + chunk_size])
+            similarities = embeddings @ self.centroids.T
+            best = np.argmax(similarities, axis=1)
+            best_scores = similarities[np.arange(len(best)), best]
+            results.extend((self.intents[index], float(score)) for index, score in zip(best, best_scores))
+        return results
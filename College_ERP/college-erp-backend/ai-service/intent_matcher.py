@@ -0,0 +1,78 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from spell_correction import DeletionIndex
+from text_processing import tokenize, tokenize_with_spans
+
+# Shortest token the typo index corrects; five-letter words like "apple" or "feels" are too often real words
+TYPO_MIN_LENGTH = 6
+
+
+class IntentMatcher:
+    """Word-boundary keyword matcher compiled once from the intent keyword tables.
+
+    Keywords (including multi-word phrases such as "good morning") are compiled
+    into a single hash table keyed by token tuples. A message is tokenized once
+    and every token position is looked up directly, so the cost of matching
+    depends on the message length and not on how many keywords are configured.
+
+    When ``typo_tolerant`` is set, tokens that are not keywords are first resolved
+    through a SymSpell-style deletion index, so "libary" matches "library". Tokens
+    in ``known_words`` are real words and pass through unchanged, so "contract"
+    never becomes "contact".
+    """
+
+    def __init__(self, intent_keywords: Dict[str, Iterable[str]], typo_tolerant: bool = True,
+                 known_words: Iterable[str] = ()):
+        self.intents = list(intent_keywords.keys())
+        self.phrases: Dict[Tuple[str, ...], List[str]] = {}
+        self.max_phrase_length = 1
+
+        for intent, keywords in intent_keywords.items():
+            for keyword in keywords:
+                tokens = tuple(tokenize(keyword))
+                if not tokens:
+                    continue
+                phrase_intents = self.phrases.setdefault(tokens, [])
+                if intent not in phrase_intents:
+                    phrase_intents.append(intent)
+                self.max_phrase_length = max(self.max_phrase_length, len(tokens))
+
+        self.spell_index = None
+        if typo_tolerant:
+            self.spell_index = DeletionIndex({word for phrase in self.phrases for word in phrase},
+                                             min_word_length=TYPO_MIN_LENGTH, known_words=known_words)
+
+    def match(self, message: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Return every matched intent with the character spans of its keyword matches"""
+        tokens = tokenize_with_spans(message)
+        if self.spell_index:
+            tokens = [(self.spell_index.lookup(token) or token, start, end) for token, start, end in tokens]
+        matches: Dict[str, List[Tuple[int, int]]] = {}
+
+        for start in range(len(tokens)):
+            longest = min(self.max_phrase_length, len(tokens) - start)
+            for length in range(1, longest + 1):
+                window = tokens[start:start + length]
+                phrase_intents = self._lookup(tuple(token for token, _, _ in window))
+                if not phrase_intents:
+                    continue
+                span = (window[0][1], window[-1][2])
+                for intent in phrase_intents:
+                    matches.setdefault(intent, []).append(span)
+
+        return matches
+
+    def _lookup(self, words: Tuple[str, ...]) -> Optional[List[str]]:
+        """Look up a token tuple, accepting simple plural forms of the last word"""
+        phrase_intents = self.phrases.get(words)
+        if phrase_intents is not None:
+            return phrase_intents
+
+        last = words[-1]
+        if len(last) > 3 and last.endswith("s"):
+            for stem in (last[:-1], last[:-2] if last.endswith("es") else None):
+                if stem:
+                    phrase_intents = self.phrases.get(words[:-1] + (stem,))
+                    if phrase_intents is not None:
+                        return phrase_intents
+        return None
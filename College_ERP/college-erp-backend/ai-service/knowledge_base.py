@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from faq_retriever import FAQRetriever
+from intent_classifier import CentroidIntentClassifier
+from intent_matcher import IntentMatcher
+from question_suggester import QuestionSuggester
+from text_processing import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Common English words, one per line, that keyword typo correction must leave alone
+COMMON_WORDS_PATH = Path(__file__).resolve().parent / "data" / "common_words.txt"
+
+
+def _load_document(path: Path) -> Dict[str, Any]:
+    """Load a JSON or YAML knowledge file"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ValueError(f"PyYAML is required to load {path.name}") from e
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+@lru_cache(maxsize=1)
+def common_words() -> frozenset:
+    """Load the common English word list, or nothing if it is missing"""
+    try:
+        with open(COMMON_WORDS_PATH, "r", encoding="utf-8") as f:
+            return frozenset(word for word in f.read().split())
+    except OSError:
+        return frozenset()
+
+
+class KnowledgeSnapshot:
+    """Fully compiled, read-only view of the knowledge base files.
+
+    Request handlers take ``KnowledgeBase.current`` once and use that snapshot for
+    the whole request, so a reload can never expose a half-built index to them.
+    """
+
+    def __init__(self, version: int, knowledge: Dict[str, Any], faq_entries: List[Dict[str, Any]],
+                 intent_examples: Dict[str, List[str]], intent_engine: str):
+        self.version = version
+        self.loaded_at = datetime.now().isoformat()
+
+        self.college_context = knowledge["college_context"]
+        self.response_patterns = knowledge["response_patterns"]
+        self.intent_keywords = knowledge["intent_keywords"]
+
+        # Response patterns with their "{}" placeholders filled in once per snapshot
+        self.formatted_patterns = self._format_response_patterns()
+
+        # Keyword tables compiled once into a single-pass matcher; words of the FAQ corpus are
+        # known to be spelled correctly and never typo-corrected
+        faq_words = {word for entry in faq_entries for word in tokenize(f"{entry.get('question', '')} {entry.get('answer', '')}")}
+        self.intent_matcher = IntentMatcher(self.intent_keywords, known_words=common_words() | faq_words)
+
+        # Optional learned intent engine replacing the keyword tables
+        self.intent_classifier = CentroidIntentClassifier(intent_examples) if intent_engine == "centroid" else None
+
+        self.faq_retriever = FAQRetriever(faq_entries) if faq_entries else None
+        self.question_suggester = QuestionSuggester(self._canonical_questions(faq_entries, intent_examples))
+
+    def _format_response_patterns(self) -> Dict[str, Tuple[str, ...]]:
+        """Fill each category's "{}" placeholder from the college context"""
+        placeholder_values = {
+            "admission": self.college_context["contact"]["admission"],
+            "library": self.college_context["timings"]["library"],
+            "courses": ", ".join(self.college_context["courses"]),
+            "facilities": ", ".join(self.college_context["facilities"])
+        }
+        formatted = {}
+        for category, responses in self.response_patterns.items():
+            value = placeholder_values.get(category)
+            formatted[category] = tuple(
+                response.format(value) if value is not None and "{}" in response else response
+                for response in responses
+            )
+        return formatted
+
+    @staticmethod
+    def _canonical_questions(faq_entries: List[Dict[str, Any]], intent_examples: Dict[str, List[str]]) -> List[Tuple[str, float]]:
+        """Collect (question, popularity weight) pairs for autocomplete"""
+        questions = [(entry["question"], float(entry.get("popularity", 1))) for entry in faq_entries]
+        for intent, utterances in intent_examples.items():
+            # Greetings and help requests are not useful completions
+            if intent not in ("greeting", "help"):
+                questions.extend((utterance, 10.0) for utterance in utterances)
+        return questions
+
+
+class KnowledgeBase:
+    """Knowledge base loaded from files and hot-reloaded when they change.
+
+    ``watch`` polls the files' mtimes through ``reload_if_changed``, run off the event
+    loop; on a change the new snapshot is compiled and published by assigning ``current``, a single reference swap.
+    Readers never lock, and a file that fails to load leaves the previous snapshot
+    in place; the files' mtimes are only recorded once a snapshot is published, so
+    a failed reload is tried again on the next poll.
+    """
+
+    def __init__(self, knowledge_path: Path, faq_path: Path, examples_path: Path, intent_engine: str = "keywords"):
+        if intent_engine not in ("keywords", "centroid"):
+            raise ValueError(f"Unknown intent engine '{intent_engine}'")
+        self.knowledge_path = knowledge_path
+        self.faq_path = faq_path
+        self.examples_path = examples_path
+        self.intent_engine = intent_engine
+        self.reload_count = 0
+
+        self._version = 0
+        self._mtimes = self._read_mtimes()
+        self.current = self._compile()
+
+    def _read_mtimes(self) -> Tuple[Optional[int], ...]:
+        """Return the modification time of every watched file"""
+        mtimes = []
+        for path in (self.knowledge_path, self.faq_path, self.examples_path):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _compile(self) -> KnowledgeSnapshot:
+        """Load every knowledge file and compile a new snapshot"""
+        knowledge = _load_document(self.knowledge_path)
+
+        # The FAQ corpus and intent examples are optional
+        faq_entries: List[Dict[str, Any]] = []
+        intent_examples: Dict[str, List[str]] = {}
+        if self.faq_path.exists():
+            faq_entries = _load_document(self.faq_path).get("entries", [])
+        if self.examples_path.exists():
+            intent_examples = _load_document(self.examples_path).get("intents", {})
+
+        # The version only advances once a snapshot has compiled, so failed reloads leave no gaps
+        snapshot = KnowledgeSnapshot(self._version + 1, knowledge, faq_entries, intent_examples, self.intent_engine)
+        self._version = snapshot.version
+        return snapshot
+
+    def reload_if_changed(self) -> bool:
+        """Recompile and publish a new snapshot if any watched file changed"""
+        mtimes = self._read_mtimes()
+        if mtimes == self._mtimes:
+            return False
+        self.current = self._compile()
+        self._mtimes = mtimes
+        self.reload_count += 1
+        return True
+
+    async def watch(self, interval: float = 2.0):
+        """Poll the knowledge files and hot-swap the compiled snapshot on change"""
+        failed_mtimes = None
+        while True:
+            await asyncio.sleep(interval)
+
+            # Any error in a malformed file (YAML, JSON, a wrong type) must not end the watcher
+            try:
+                reloaded = await asyncio.to_thread(self.reload_if_changed)
+            except Exception:
+                # Retried on every poll, but reported once per edit
+                mtimes = self._read_mtimes()
+                if mtimes != failed_mtimes:
+                    logger.exception("Knowledge base reload failed, keeping version %d", self.current.version)
+                failed_mtimes = mtimes
+                continue
+
+            if reloaded:
+                logger.info("Knowledge base reloaded (version %d)", self.current.version)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the published snapshot's version and reload counters"""
+        return {
+            "version": self.current.version,
+            "loaded_at": self.current.loaded_at,
+            "reload_count": self.reload_count
+        }
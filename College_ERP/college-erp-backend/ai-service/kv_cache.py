@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from latency_stats import LatencyWindow
+
+
+def cache_nbytes(past: Any) -> int:
+    """Memory held by the key/value tensors of a transformers or ONNX cache"""
+    if isinstance(past, list):
+        # The ONNX backend keeps its cache as numpy arrays
+        return sum(array.nbytes for array in past)
+    layers = getattr(past, "layers", None)
+    if layers is not None:
+        tensors = [tensor for layer in layers for tensor in (layer.keys, layer.values) if tensor is not None]
+    else:
+        tensors = list(past.key_cache) + list(past.value_cache)
+    return sum(tensor.element_size() * tensor.nelement() for tensor in tensors)
+
+
+class KVCacheEntry:
+    """Attention cache of one conversation's context, as token ids and their past key/values"""
+
+    __slots__ = ("token_ids", "past", "nbytes")
+
+    def __init__(self, token_ids: List[int], past: Any):
+        self.token_ids = token_ids
+        self.past = past
+        self.nbytes = cache_nbytes(past)
+
+
+class KVCachePool:
+    """Per-conversation ``past_key_values`` kept between turns, bounded by total memory.
+
+    Entries are evicted least recently used first once their tensors exceed
+    ``max_bytes``. Callers check that an entry still prefixes the next prompt
+    and drop it otherwise, e.g. when the context window slides. The time and
+    token count of each turn's prefill are recorded.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, KVCacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.prefill_time = LatencyWindow()
+        self.prefilled_tokens = 0
+        self.reused_tokens = 0
+
+    def get(self, conversation_id: str) -> Optional[KVCacheEntry]:
+        """Return a conversation's entry, marking it most recently used"""
+        entry = self._entries.get(conversation_id)
+        if entry is not None:
+            self._entries.move_to_end(conversation_id)
+        return entry
+
+    def put(self, conversation_id: str, token_ids: List[int], past: Any):
+        """Keep a conversation's cache, evicting least recently used entries over the memory cap"""
+        self.discard(conversation_id)
+        entry = KVCacheEntry(token_ids, past)
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[conversation_id] = entry
+        self.total_bytes += entry.nbytes
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def discard(self, conversation_id: str):
+        """Drop a conversation's entry if it has one"""
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.nbytes
+
+    def invalidate(self, conversation_id: str):
+        """Drop an entry that no longer matches its conversation's context"""
+        self.discard(conversation_id)
+        self.invalidations += 1
+
+    def record_prefill(self, seconds: float, prefilled: int, reused: int):
+        """Account for one turn's prefill of ``prefilled`` new tokens on top of ``reused`` cached ones"""
+        self.prefill_time.record(seconds)
+        self.prefilled_tokens += prefilled
+        self.reused_tokens += reused
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache occupancy, hit rates and prefill cost"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "prefilled_tokens": self.prefilled_tokens,
+            "reused_tokens": self.reused_tokens,
+            "prefill": self.prefill_time.stats()
+        }
@@ -0,0 +1,33 @@
+from collections import deque
+from typing import Any, Dict
+
+
+class LatencyWindow:
+    """Rolling window of recent latency samples with percentile summaries.
+
+    Only the latest ``max_samples`` observations are kept, so the summary tracks
+    current behaviour rather than the whole lifetime of the process.
+    """
+
+    def __init__(self, max_samples: int = 1024):
+        self._samples: deque = deque(maxlen=max_samples)
+        self.count = 0
+
+    def record(self, seconds: float):
+        """Add one latency observation in seconds"""
+        self._samples.append(seconds)
+        self.count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarize the window in milliseconds"""
+        if not self._samples:
+            return {"count": self.count, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        return {
+            "count": self.count,
+            "p50_ms": round(ordered[round(last * 0.50)] * 1000, 2),
+            "p95_ms": round(ordered[round(last * 0.95)] * 1000, 2),
+            "p99_ms": round(ordered[round(last * 0.99)] * 1000, 2)
+        }
@@ -1,17 +1,66 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import asyncio
 import json
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 # Import our AI modules (using simple implementations)
-from simple_ai_chatbot import SimpleAIChatbot
+from knowledge_base import KnowledgeBase
+from simple_ai_chatbot import DATA_DIR, SimpleAIChatbot
 from simple_portfolio_generator import SimplePortfolioGenerator
+from message_log import to_epoch_us
 
-app = FastAPI(title="College ERP AI Service", version="1.0.0")
+# Initialize AI services (using simple implementations);
+# AI_CHATBOT_BACKEND=model serves chat from the transformer-backed AIChatbot instead
+MODEL_CHATBOT = os.getenv("AI_CHATBOT_BACKEND", "simple") == "model"
+if MODEL_CHATBOT:
+    from ai_chatbot import AIChatbot
+    chatbot = AIChatbot()
+    # /chat/suggest only needs the knowledge base, not a second chatbot with its own conversation store
+    knowledge_base = KnowledgeBase(
+        knowledge_path=DATA_DIR / "knowledge_base.json",
+        faq_path=DATA_DIR / "faq.json",
+        examples_path=DATA_DIR / "intent_examples.json"
+    )
+else:
+    # INTENT_ENGINE=centroid classifies rule-based chat intents by example similarity instead of keywords
+    chatbot = SimpleAIChatbot(intent_engine=os.getenv("INTENT_ENGINE", "keywords"))
+    knowledge_base = chatbot.knowledge_base
+
+# PORTFOLIO_BACKEND=model writes portfolio text with the transformer-backed PortfolioGenerator
+if os.getenv("PORTFOLIO_BACKEND", "simple") == "model":
+    from portfolio_generator import PortfolioGenerator
+    portfolio_gen = PortfolioGenerator()
+else:
+    portfolio_gen = SimplePortfolioGenerator()
+
+# Largest number of messages accepted by /chat/batch
+MAX_BATCH_SIZE = 1000
+
+# Longest message accepted over /ws/chat
+MAX_WS_MESSAGE_LENGTH = 4000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the AI services' background tasks for the lifetime of the app"""
+    chatbot.start_background_tasks()
+    # The rule-based chatbot watches its own knowledge base
+    watch_task = asyncio.create_task(knowledge_base.watch()) if MODEL_CHATBOT else None
+    if not isinstance(portfolio_gen, SimplePortfolioGenerator):
+        portfolio_gen.start_background_tasks()
+    yield
+    if not isinstance(portfolio_gen, SimplePortfolioGenerator):
+        await portfolio_gen.stop_background_tasks()
+    if watch_task is not None:
+        watch_task.cancel()
+    await chatbot.stop_background_tasks()
+
+app = FastAPI(title="College ERP AI Service", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -22,10 +71,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize AI services (using simple implementations)
-chatbot = SimpleAIChatbot()
-portfolio_gen = SimplePortfolioGenerator()
-
 # Pydantic models for request/response
 class ChatMessage(BaseModel):
     message: str
@@ -36,6 +81,21 @@ class ChatResponse(BaseModel):
     response: str
     conversation_id: str
     timestamp: str
+    confidence: Optional[float] = None
+
+class BatchChatRequest(BaseModel):
+    messages: List[ChatMessage] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class BatchChatResult(BaseModel):
+    index: int
+    response: Optional[str] = None
+    conversation_id: Optional[str] = None
+    timestamp: Optional[str] = None
+    confidence: Optional[float] = None
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
 
 class StudentRecord(BaseModel):
     student_id: str
@@ -85,6 +145,77 @@ async def chat_with_ai(chat_request: ChatMessage):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating chat response: {str(e)}")
 
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch_request: BatchChatRequest):
+    """
+    Chat with the AI assistant for many messages in one request; results keep input order
+    """
+    try:
+        results = await chatbot.generate_responses([item.model_dump() for item in batch_request.messages])
+        return {"results": [{"index": index, **result} for index, result in enumerate(results)]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating chat responses: {str(e)}")
+
+@app.post("/chat/stream")
+async def chat_stream(chat_request: ChatMessage):
+    """
+    Chat with the AI assistant, streaming the reply as server-sent events
+    """
+    async def events():
+        try:
+            async for event in chatbot.stream_response(
+                message=chat_request.message,
+                user_id=chat_request.user_id,
+                conversation_id=chat_request.conversation_id
+            ):
+                yield f"event: {event.pop('type')}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': f'Error generating chat response: {str(e)}'})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _parse_ws_message(text: str) -> Optional[str]:
+    """Accept either a bare text frame or a {"message": ...} JSON frame"""
+    if text.startswith("{"):
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return None
+        message = payload.get("message") if isinstance(payload, dict) else None
+        return message if isinstance(message, str) else None
+    return text
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, user_id: Optional[str] = None, conversation_id: Optional[str] = None):
+    """
+    Chat over a WebSocket bound to one conversation for the life of the connection
+    """
+    await websocket.accept()
+    session = await chatbot.open_session(user_id, conversation_id)
+    await websocket.send_json({"type": "session", "conversation_id": session.conversation_id})
+    
+    try:
+        while True:
+            message = _parse_ws_message(await websocket.receive_text())
+            if not message:
+                await websocket.send_json({"type": "error", "detail": "Expected a non-empty message"})
+                continue
+            if len(message) > MAX_WS_MESSAGE_LENGTH:
+                await websocket.send_json({"type": "error", "detail": f"message too long (max {MAX_WS_MESSAGE_LENGTH} characters)"})
+                continue
+            try:
+                response = await session.send(message)
+            except Exception as e:
+                await websocket.send_json({"type": "error", "detail": f"Error generating chat response: {str(e)}"})
+                continue
+            await websocket.send_json({"type": "message", **response})
+    except WebSocketDisconnect:
+        pass
+
 @app.post("/generate-portfolio", response_model=PortfolioResponse)
 async def generate_student_portfolio(portfolio_request: PortfolioRequest):
     """
@@ -99,14 +230,54 @@ async def generate_student_portfolio(portfolio_request: PortfolioRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating portfolio: {str(e)}")
 
+@app.get("/chat/suggest")
+async def suggest_chat_questions(q: str = Query("", max_length=200), limit: int = Query(5, ge=1, le=10)):
+    """
+    Suggest questions completing a partially typed chat message
+    """
+    return {"query": q, "suggestions": knowledge_base.current.question_suggester.suggest(q, limit)}
+
+@app.get("/chat/stats")
+async def get_chat_stats():
+    """
+    Get chatbot index and cache statistics
+    """
+    return chatbot.get_stats()
+
+@app.get("/chat/search")
+async def search_chat_history(user_id: str, q: str = Query(..., min_length=1, max_length=200), limit: int = Query(10, ge=1, le=50)):
+    """
+    Search a user's past chat messages, returning ranked snippets
+    """
+    try:
+        return {"results": await chatbot.search_conversations(user_id, q, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching conversations: {str(e)}")
+
+@app.get("/chat/export")
+async def export_conversations(user_id: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Stream full conversations as NDJSON, optionally filtered by user and by last update in [since, until)
+    """
+    async def lines():
+        async for record in chatbot.export_conversations(
+            user_id=user_id,
+            since=to_epoch_us(since) if since else None,
+            until=to_epoch_us(until) if until else None
+        ):
+            yield json.dumps(record) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.get("/chat/conversations/{user_id}")
-async def get_user_conversations(user_id: str):
+async def get_user_conversations(user_id: str, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None):
     """
-    Get conversation history for a user
+    Get conversation history for a user, most recently updated first; pass next_cursor back to page
     """
     try:
-        conversations = await chatbot.get_user_conversations(user_id)
-        return {"conversations": conversations}
+        return await chatbot.get_user_conversations(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching conversations: {str(e)}")
 
@@ -121,6 +292,13 @@ async def delete_conversation(conversation_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting conversation: {str(e)}")
 
+@app.get("/portfolio/stats")
+async def get_portfolio_stats():
+    """
+    Get generated and wasted tokens and stop reasons per portfolio section
+    """
+    return portfolio_gen.get_stats()
+
 @app.get("/portfolio/templates")
 async def get_portfolio_templates():
     """
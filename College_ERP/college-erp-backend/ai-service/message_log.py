@@ -0,0 +1,82 @@
+import sys
+import time
+from array import array
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Union
+
+# Roles are stored as one-byte codes; the strings are interned once here. "summary" marks
+# the record that compaction folds older turns into
+ROLES = ("user", "assistant", "summary")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+def now_us() -> int:
+    """Current wall-clock time in integer microseconds since the epoch"""
+    return time.time_ns() // 1000
+
+
+def format_timestamp(timestamp_us: int) -> str:
+    """Format epoch microseconds as a local ISO-8601 string, like datetime.now().isoformat()"""
+    seconds, microseconds = divmod(timestamp_us, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=microseconds).isoformat()
+
+
+def to_epoch_us(value: datetime) -> int:
+    """Convert a datetime (naive values are local time) to epoch microseconds"""
+    return round(value.timestamp() * 1_000_000)
+
+
+class MessageRecord(NamedTuple):
+    """Read-only view of one message, materialized on access"""
+    role: str
+    content: str
+    timestamp_us: int
+
+    @property
+    def timestamp(self) -> str:
+        return format_timestamp(self.timestamp_us)
+
+
+class MessageLog:
+    """Columnar message history of one conversation.
+
+    Roles live in a byte array, timestamps in an int64 array and contents in a
+    plain list, so a message costs one list slot plus nine bytes on top of its
+    text instead of a dict and an ISO timestamp string. Indexing and iteration
+    yield ``MessageRecord`` views.
+    """
+
+    __slots__ = ("roles", "timestamps", "contents")
+
+    def __init__(self):
+        self.roles = array("b")
+        self.timestamps = array("q")
+        self.contents: List[str] = []
+
+    def append(self, role: str, content: str, timestamp_us: int) -> MessageRecord:
+        """Append a message and return its record"""
+        self.roles.append(ROLE_CODES[role])
+        self.timestamps.append(timestamp_us)
+        self.contents.append(content)
+        return MessageRecord(role, content, timestamp_us)
+
+    def clear(self):
+        """Remove every message"""
+        del self.roles[:], self.timestamps[:], self.contents[:]
+
+    def nbytes(self) -> int:
+        """Estimate the memory held by the log, including message text"""
+        return (sys.getsizeof(self.roles) + sys.getsizeof(self.timestamps) + sys.getsizeof(self.contents)
+                + sum(sys.getsizeof(content) for content in self.contents))
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.contents)))]
+        return MessageRecord(ROLES[self.roles[index]], self.contents[index], self.timestamps[index])
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        for code, content, timestamp_us in zip(self.roles, self.contents, self.timestamps):
+            yield MessageRecord(ROLES[code], content, timestamp_us)
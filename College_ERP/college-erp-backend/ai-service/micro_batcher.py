@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from latency_stats import LatencyWindow
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batched calls.
+
+    Requests submitted while fewer than ``max_concurrency`` batches are running
+    are held for at most ``max_wait`` seconds, or until ``max_batch`` of them have
+    arrived, and then handed to ``process_batch`` together. While every slot is
+    busy, requests keep gathering and go out as soon as a slot frees up, so
+    batches grow with load instead of queueing one by one. ``process_batch``
+    returns one result per item, in order.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]], max_batch: int = 8,
+                 max_wait: float = 0.005, max_concurrency: int = 1):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+
+        # (item, future awaiting its result, submit time in perf_counter seconds)
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+        self.wait_time = LatencyWindow()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """Get batch sizes and the time requests spent gathering"""
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "wait": self.wait_time.stats()
+        }
+
+    def _dispatch(self):
+        """Start a batch from the pending requests if a slot is free"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Callers that gave up while waiting are dropped before they cost any work
+        self._pending = [entry for entry in self._pending if not entry[1].done()]
+        loop = asyncio.get_running_loop()
+        while self._pending and len(self._running) < self.max_concurrency:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = loop.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        """Free a batch slot; requests that gathered meanwhile have waited long enough"""
+        self._running.discard(task)
+        if self._pending:
+            self._dispatch()
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        """Process one batch and resolve its callers"""
+        now = time.perf_counter()
+        for _, _, submitted in batch:
+            self.wait_time.record(now - submitted)
+        self.batches += 1
+        self.items += len(batch)
+
+        try:
+            results = await self.process_batch([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
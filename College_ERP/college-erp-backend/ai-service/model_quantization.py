@@ -0,0 +1,84 @@
+import os
+import pickle
+import re
+from types import SimpleNamespace
+from typing import Any, Optional
+
+QUANTIZATION_MODES = ("none", "int8")
+
+
+def quantize_int8(model: Any) -> Any:
+    """Quantize the linear layers of a model to int8 weights with dynamically quantized activations"""
+    import torch
+    _replace_conv1d(model)
+    # In place, so each fp32 layer is released as soon as its int8 replacement exists
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _replace_conv1d(module: Any):
+    """Swap GPT-2 style Conv1D projections, which dynamic quantization skips, for equivalent Linear layers"""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            # Conv1D computes x @ weight + bias with weight stored as (in_features, out_features)
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = torch.nn.Parameter(child.bias.detach())
+            setattr(module, name, linear)
+        else:
+            _replace_conv1d(child)
+
+
+def quantized_model_path(cache_dir: str, model_name: str) -> str:
+    """Location of a model's cached int8 copy; it is pickled whole, so it is tied to the torch and transformers versions"""
+    import torch
+    import transformers
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+    return os.path.join(cache_dir, f"{safe_name}.int8.torch-{torch.__version__}.transformers-{transformers.__version__}.pt")
+
+
+def _torch_attribute(name: str) -> Any:
+    """Look up a torch module attribute; how pickled quantization schemes are restored"""
+    import torch
+    return getattr(torch, name)
+
+
+class _QuantizedModelPickler(pickle.Pickler):
+    """Pickler that stores torch quantization schemes as explicit references to torch.
+
+    Plain pickle finds the module of a scheme such as ``torch.per_tensor_affine``
+    by probing every imported module, and transformers' lazy alias modules
+    import optional vision dependencies when probed.
+    """
+
+    def reducer_override(self, obj):
+        import torch
+        if isinstance(obj, torch.qscheme):
+            return _torch_attribute, (str(obj).rsplit(".", 1)[-1],)
+        return NotImplemented
+
+
+def load_int8_causal_lm(model_name: str, cache_dir: Optional[str] = None) -> Any:
+    """Load a causal language model with int8 linear layers, reusing weights cached in ``cache_dir``.
+
+    Without a cache the fp32 weights are loaded and quantized; with one, the
+    first load saves the quantized model and later loads read it back without
+    ever materializing the fp32 weights.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    path = quantized_model_path(cache_dir, model_name) if cache_dir else None
+    if path is not None and os.path.exists(path):
+        # Packed int8 weights are not plain tensors, so the (locally written) file is fully unpickled
+        return torch.load(path, weights_only=False).eval()
+
+    model = quantize_int8(AutoModelForCausalLM.from_pretrained(model_name).eval())
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.tmp"
+        torch.save(model, partial, pickle_module=SimpleNamespace(__name__="pickle", Pickler=_QuantizedModelPickler))
+        os.replace(partial, path)
+    return model.eval()
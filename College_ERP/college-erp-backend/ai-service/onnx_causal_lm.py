@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def onnx_model_dir(model_name: str) -> str:
+    """Directory holding a model's ONNX export, under ONNX_MODEL_DIR (default onnx_models)"""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+    return os.path.join(os.getenv("ONNX_MODEL_DIR", "onnx_models"), safe_name)
+
+
+def ensure_exported(model_name: str) -> str:
+    """Return a model's export directory, exporting it first if needed (the only step that needs torch)"""
+    model_dir = onnx_model_dir(model_name)
+    if not os.path.exists(os.path.join(model_dir, "model.onnx")):
+        print(f"Exporting {model_name} to ONNX in {model_dir}...")
+        from onnx_export import export_causal_lm
+        export_causal_lm(model_name, model_dir)
+    return model_dir
+
+
+class OnnxTokenizer:
+    """The part of a transformers tokenizer the service uses, backed by the ``tokenizers`` library.
+
+    Encodes to plain lists or numpy arrays (``return_tensors="np"``), so an
+    ONNX deployment tokenizes without importing torch.
+    """
+
+    def __init__(self, model_dir: str):
+        from tokenizers import Tokenizer
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.no_padding()
+        self._tokenizer.no_truncation()
+        with open(os.path.join(model_dir, "onnx_config.json")) as f:
+            config = json.load(f)
+        self.eos_token = config["eos_token"]
+        self.eos_token_id = config["eos_token_id"]
+        self.pad_token: Optional[str] = None
+        self.padding_side = "right"
+
+    @property
+    def pad_token_id(self) -> Optional[int]:
+        return self._tokenizer.token_to_id(self.pad_token) if self.pad_token is not None else None
+
+    def encode(self, text: str, return_tensors: Optional[str] = None, truncation: bool = False,
+               max_length: Optional[int] = None) -> Any:
+        """Tokenize text into ids, as a list or a (1, length) array"""
+        token_ids = self._tokenizer.encode(text).ids
+        if truncation and max_length is not None:
+            token_ids = token_ids[:max_length]
+        return self._as_tensor([token_ids], return_tensors) if return_tensors else token_ids
+
+    def decode(self, token_ids: Sequence[int], skip_special_tokens: bool = False, **kwargs) -> str:
+        """Turn token ids back into text"""
+        return self._tokenizer.decode([int(token_id) for token_id in token_ids], skip_special_tokens=skip_special_tokens)
+
+    def pad(self, encoded: Dict[str, List[List[int]]], return_tensors: Optional[str] = None) -> Dict[str, Any]:
+        """Pad sequences of token ids to a common length on ``padding_side``"""
+        if self.pad_token_id is None:
+            raise ValueError("Asking to pad but the tokenizer does not have a padding token")
+        rows = encoded["input_ids"]
+        length = max(map(len, rows))
+        input_ids, attention_mask = [], []
+        for row in rows:
+            padding = [self.pad_token_id] * (length - len(row))
+            mask = [1] * len(row)
+            if self.padding_side == "left":
+                input_ids.append(padding + list(row))
+                attention_mask.append([0] * len(padding) + mask)
+            else:
+                input_ids.append(list(row) + padding)
+                attention_mask.append(mask + [0] * len(padding))
+        return {
+            "input_ids": self._as_tensor(input_ids, return_tensors),
+            "attention_mask": self._as_tensor(attention_mask, return_tensors)
+        }
+
+    def _as_tensor(self, rows: List[List[int]], return_tensors: Optional[str]) -> Any:
+        if return_tensors is None:
+            return rows
+        if return_tensors != "np":
+            raise ValueError(f"The ONNX tokenizer returns numpy arrays, not {return_tensors!r} tensors")
+        return np.array(rows, dtype=np.int64)
+
+
+class OnnxCausalLM:
+    """Causal language model exported by ``onnx_export`` and run with onnxruntime on CPU.
+
+    ``generate`` covers the arguments the service passes to transformers'
+    ``generate`` (sampling with temperature and top-k, streamers, stopping
+    criteria, ``max_time``) and works on numpy arrays. Past keys/values are
+    plain arrays, one key and one value per layer, and can be carried from one
+    call to the next. The graph is optimized once and the optimized copy is
+    saved next to the export, so later sessions start without optimizing again.
+    """
+
+    def __init__(self, model_dir: str, threads: int = 0):
+        import onnxruntime
+        with open(os.path.join(model_dir, "onnx_config.json")) as f:
+            config = json.load(f)
+        self.layers = config["layers"]
+        self.heads = config["heads"]
+        self.head_dim = config["head_dim"]
+        self.eos_token_id = config["eos_token_id"]
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        # Saved graphs stop at the extended level, which holds the fusions and stays hardware independent
+        optimized = os.path.join(model_dir, f"model.ort-{onnxruntime.__version__}.optimized.onnx")
+        if os.path.exists(optimized):
+            path = optimized
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        else:
+            path = os.path.join(model_dir, "model.onnx")
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+            options.optimized_model_filepath = optimized
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._past_names = [f"past.{layer}.{part}" for layer in range(self.layers) for part in ("key", "value")]
+
+    def forward(self, input_ids: np.ndarray, attention_mask: np.ndarray, position_ids: np.ndarray,
+                past: Optional[List[np.ndarray]] = None) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Run the new tokens on top of ``past``, returning their logits and the extended past"""
+        if past is None:
+            empty = np.zeros((input_ids.shape[0], self.heads, 0, self.head_dim), dtype=np.float32)
+            past = [empty] * len(self._past_names)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask, "position_ids": position_ids}
+        feed.update(zip(self._past_names, past))
+        logits, *present = self.session.run(None, feed)
+        return logits, present
+
+    def generate(self, input_ids: Any, attention_mask: Any = None, past_key_values: Optional[List[np.ndarray]] = None,
+                 max_new_tokens: int = 20, min_new_tokens: int = 0, max_time: Optional[float] = None,
+                 do_sample: bool = False, temperature: float = 1.0, top_k: int = 50, pad_token_id: Optional[int] = None,
+                 streamer: Any = None, stopping_criteria: Optional[Sequence[Any]] = None, return_past: bool = False,
+                 **kwargs) -> Any:
+        """Extend each row of ``input_ids`` by up to ``max_new_tokens`` tokens.
+
+        Rows that end (end-of-sequence or a stopping criterion) are padded until
+        all have. With ``past_key_values`` only the uncached tail of the prompt is
+        run. Returns the sequences, plus the past when ``return_past`` is set.
+        """
+        started = time.perf_counter()
+        sequences = np.asarray(input_ids, dtype=np.int64)
+        mask = np.ones_like(sequences) if attention_mask is None else np.asarray(attention_mask, dtype=np.int64)
+        positions = np.maximum(mask.cumsum(axis=1) - 1, 0)
+        pad_token_id = self.eos_token_id if pad_token_id is None else pad_token_id
+        cached = past_key_values[0].shape[2] if past_key_values else 0
+        past = past_key_values
+
+        if streamer is not None:
+            streamer.put(sequences)
+        step_ids, step_positions = sequences[:, cached:], positions[:, cached:]
+        unfinished = np.ones(sequences.shape[0], dtype=bool)
+        for step in range(max_new_tokens):
+            logits, past = self.forward(step_ids, mask, step_positions, past)
+            scores = logits[:, -1, :]
+            if step < min_new_tokens:
+                scores[:, self.eos_token_id] = -np.inf
+            next_tokens = self._sample(scores, temperature, top_k) if do_sample else scores.argmax(axis=-1)
+            next_tokens = np.where(unfinished, next_tokens, pad_token_id)
+
+            sequences = np.concatenate([sequences, next_tokens[:, None]], axis=1)
+            if streamer is not None:
+                streamer.put(next_tokens)
+            unfinished &= next_tokens != self.eos_token_id
+            for criteria in stopping_criteria or ():
+                unfinished &= ~np.asarray(criteria(sequences, scores), dtype=bool)
+            if not unfinished.any() or (max_time is not None and time.perf_counter() - started >= max_time):
+                break
+
+            mask = np.concatenate([mask, np.ones((mask.shape[0], 1), dtype=np.int64)], axis=1)
+            step_ids, step_positions = next_tokens[:, None], step_positions[:, -1:] + 1
+
+        if streamer is not None:
+            streamer.end()
+        return (sequences, past) if return_past else sequences
+
+    def continue_generation(self, token_ids: List[int], past: Optional[List[np.ndarray]],
+                            **generate_kwargs) -> Tuple[np.ndarray, List[np.ndarray], float, int]:
+        """Prefill the prompt tokens missing from ``past``, generate, and cut ``past`` back to the prompt"""
+        reused = past[0].shape[2] if past else 0
+        if reused >= len(token_ids):
+            past, reused = None, 0
+        prompt = np.array([token_ids], dtype=np.int64)
+
+        # The last prompt token is left for generate, which needs at least one uncached token
+        started = time.perf_counter()
+        if len(token_ids) - 1 > reused:
+            _, past = self.forward(
+                prompt[:, reused:-1],
+                np.ones((1, len(token_ids) - 1), dtype=np.int64),
+                np.arange(reused, len(token_ids) - 1, dtype=np.int64)[None, :],
+                past
+            )
+        prefill_seconds = time.perf_counter() - started
+
+        outputs, past = self.generate(prompt, past_key_values=past, return_past=True, **generate_kwargs)
+        past = [np.ascontiguousarray(layer[:, :, :len(token_ids)]) for layer in past]
+        return outputs, past, prefill_seconds, reused
+
+    @staticmethod
+    def _sample(scores: np.ndarray, temperature: float, top_k: int) -> np.ndarray:
+        """Draw one token per row from the temperature-scaled distribution over the top-k logits"""
+        scores = scores / max(temperature, 1e-5)
+        if 0 < top_k < scores.shape[-1]:
+            threshold = np.partition(scores, -top_k, axis=-1)[:, -top_k][:, None]
+            scores = np.where(scores < threshold, -np.inf, scores)
+        probabilities = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        probabilities /= probabilities.sum(axis=-1, keepdims=True)
+        draws = np.random.random_sample((scores.shape[0], 1))
+        return np.minimum((probabilities.cumsum(axis=-1) < draws).sum(axis=-1), scores.shape[-1] - 1)
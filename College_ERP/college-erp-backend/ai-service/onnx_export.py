@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Export causal language models to ONNX for the onnx inference backend
+
+Usage: python onnx_export.py [model_name ...]   (exports into ONNX_MODEL_DIR, default onnx_models)
+"""
+
+import json
+import math
+import os
+import sys
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+EXPORT_OPSET = 17
+
+
+class _GPT2WithPast(torch.nn.Module):
+    """GPT-2 forward pass with explicit past keys/values, written out so it traces to a plain graph.
+
+    Takes ``input_ids`` and ``position_ids`` for the new tokens, an
+    ``attention_mask`` over past and new tokens, and one key and one value
+    tensor of shape (batch, heads, past, head_dim) per layer. Returns the
+    logits followed by the extended keys/values.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        config = model.config
+        if getattr(config, "scale_attn_by_inverse_layer_idx", False) or getattr(config, "reorder_and_upcast_attn", False):
+            raise ValueError("Exporting GPT-2 variants with rescaled attention is not supported")
+        self.model = model
+        self.heads = config.n_head
+        self.head_dim = config.n_embd // config.n_head
+
+    def forward(self, input_ids, attention_mask, position_ids, *past):
+        transformer = self.model.transformer
+        hidden = transformer.wte(input_ids) + transformer.wpe(position_ids)
+        batch, length = input_ids.shape
+        total = attention_mask.shape[1]
+
+        # New tokens see every unpadded earlier token and themselves
+        query_positions = torch.arange(length) + (total - length)
+        key_positions = torch.arange(total)
+        allowed = (key_positions[None, :] <= query_positions[:, None])[None, None] & attention_mask[:, None, None, :].bool()
+        bias = torch.where(allowed, 0.0, torch.finfo(hidden.dtype).min)
+
+        presents = []
+        for index, block in enumerate(transformer.h):
+            query, key, value = block.attn.c_attn(block.ln_1(hidden)).split(hidden.shape[-1], dim=2)
+            query, key, value = (part.view(batch, length, self.heads, self.head_dim).transpose(1, 2)
+                                 for part in (query, key, value))
+            key = torch.cat([past[2 * index], key], dim=2)
+            value = torch.cat([past[2 * index + 1], value], dim=2)
+            presents += [key, value]
+
+            weights = torch.softmax(query @ key.transpose(-1, -2) / math.sqrt(self.head_dim) + bias, dim=-1)
+            attended = (weights @ value).transpose(1, 2).reshape(batch, length, -1)
+            hidden = hidden + block.attn.c_proj(attended)
+            hidden = hidden + block.mlp(block.ln_2(hidden))
+
+        return (self.model.lm_head(transformer.ln_f(hidden)), *presents)
+
+
+def export_causal_lm(model_name: str, output_dir: str) -> str:
+    """Export a GPT-2 family model, its tokenizer and the shapes the runtime needs into ``output_dir``"""
+    model = AutoModelForCausalLM.from_pretrained(model_name).eval()
+    config = model.config
+    if config.model_type != "gpt2":
+        raise ValueError(f"ONNX export supports GPT-2 family models, not {config.model_type!r}")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    layers, heads, head_dim = config.n_layer, config.n_head, config.n_embd // config.n_head
+
+    past_names = [f"past.{layer}.{part}" for layer in range(layers) for part in ("key", "value")]
+    present_names = [f"present.{layer}.{part}" for layer in range(layers) for part in ("key", "value")]
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "position_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "total"},
+        "logits": {0: "batch", 1: "sequence"},
+        **{name: {0: "batch", 2: "past"} for name in past_names},
+        **{name: {0: "batch", 2: "total"} for name in present_names}
+    }
+
+    # Traced with a non-empty past so the concatenations stay in the graph
+    batch, past_length, length = 2, 3, 4
+    example = (
+        torch.ones((batch, length), dtype=torch.long),
+        torch.ones((batch, past_length + length), dtype=torch.long),
+        torch.arange(past_length, past_length + length).expand(batch, length),
+        *(torch.zeros((batch, heads, past_length, head_dim)) for _ in past_names)
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    partial = os.path.join(output_dir, f"model.onnx.{os.getpid()}.tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            _GPT2WithPast(model), example, partial,
+            input_names=["input_ids", "attention_mask", "position_ids", *past_names],
+            output_names=["logits", *present_names],
+            dynamic_axes=dynamic_axes,
+            opset_version=EXPORT_OPSET,
+            dynamo=False
+        )
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "onnx_config.json"), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "layers": layers,
+            "heads": heads,
+            "head_dim": head_dim,
+            "eos_token": tokenizer.eos_token,
+            "eos_token_id": tokenizer.eos_token_id
+        }, f, indent=2)
+    # The graph goes in last, so a directory holding model.onnx is a complete export
+    os.replace(partial, os.path.join(output_dir, "model.onnx"))
+    return output_dir
+
+
+def main():
+    """Export the models named on the command line"""
+    from onnx_causal_lm import onnx_model_dir
+    for model_name in sys.argv[1:] or ["microsoft/DialoGPT-medium", "gpt2"]:
+        print(f"Exported {model_name} to {export_causal_lm(model_name, onnx_model_dir(model_name))}")
+    return True
+
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -3,16 +3,29 @@ import json
 import re
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
+
+from generation_limits import GenerationLimits, GenerationStats, describe_sequence, first_sentences
+from inference_executor import InferenceExecutor, default_inference_executor, generate_tokens, load_tokenizer, tensor_type
 
 class PortfolioGenerator:
-    def __init__(self):
+    def __init__(self, executor: Optional[InferenceExecutor] = None):
         self.model_name = "gpt2"  # Lightweight text generation model
         self.tokenizer = None
         self.model = None
         self.is_initialized = False
         
+        # Model calls run on the inference executor so generation never blocks the event loop
+        self.executor = executor if executor is not None else default_inference_executor()
+        
+        # Generation budget per section; each keeps its first two sentences, so generation stops there
+        self.generation_limits = {
+            "summary": GenerationLimits(150, max_time=15.0, max_sentences=2),
+            "project": GenerationLimits(100, max_time=10.0, max_sentences=2),
+            "achievement": GenerationLimits(80, max_time=10.0, max_sentences=2),
+            "skills": GenerationLimits(100, max_time=10.0, max_sentences=2)
+        }
+        self.generation_stats = {section: GenerationStats() for section in self.generation_limits}
+        
         # Portfolio templates
         self.templates = {
             "professional": self._get_professional_template(),
@@ -21,16 +34,32 @@ class PortfolioGenerator:
             "modern": self._get_modern_template()
         }
         
-        # Initialize model asynchronously
-        asyncio.create_task(self._initialize_model())
+        # Initialize model asynchronously; without a running loop this waits for start_background_tasks()
+        self._init_task = None
+        try:
+            self._init_task = asyncio.get_running_loop().create_task(self._initialize_model())
+        except RuntimeError:
+            pass
+    
+    def start_background_tasks(self):
+        """Start loading the model if it was not started at construction"""
+        if self._init_task is None:
+            self._init_task = asyncio.create_task(self._initialize_model())
+    
+    async def stop_background_tasks(self):
+        """Stop any model load still in progress and the inference workers"""
+        if self._init_task is not None and not self._init_task.done():
+            self._init_task.cancel()
+        await asyncio.to_thread(self.executor.shutdown, True)
     
     async def _initialize_model(self):
         """Initialize the text generation model"""
         try:
             print("Initializing portfolio generator model...")
             
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            self.tokenizer = await asyncio.to_thread(load_tokenizer, self.model_name)
+            # With a process pool the model lives in the workers and self.model stays None
+            self.model = await self.executor.load_model(self.model_name)
             
             # Add padding token
             if self.tokenizer.pad_token is None:
@@ -47,6 +76,14 @@ class PortfolioGenerator:
         """Check if the model is ready"""
         return self.is_initialized
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Get generated and wasted tokens per portfolio section"""
+        return {
+            "model": self.model_name,
+            "model_ready": self.is_initialized,
+            "generation": {section: stats.stats() for section, stats in self.generation_stats.items()}
+        }
+    
     async def generate_portfolio(self, student_record: Any, template_style: str = "professional") -> Dict[str, Any]:
         """Generate a complete portfolio for a student"""
         
@@ -114,7 +151,7 @@ Key achievements: {', '.join(student_data['achievements'][:3])}
 
 Professional Summary:"""
                 
-                return await self._generate_text(prompt, max_length=150)
+                return await self._generate_text(prompt, "summary")
             except:
                 pass
         
@@ -137,7 +174,7 @@ Technologies: {project.get('technologies', [])}
 
 Enhanced description:"""
                     
-                    enhanced_description = await self._generate_text(prompt, max_length=100)
+                    enhanced_description = await self._generate_text(prompt, "project")
                     enhanced_project["enhanced_description"] = enhanced_description
                 except:
                     enhanced_project["enhanced_description"] = project.get('description', 'No description available')
@@ -165,7 +202,7 @@ Achievement: {achievement}
 
 Detailed description:"""
                     
-                    enhanced_description = await self._generate_text(prompt, max_length=80)
+                    enhanced_description = await self._generate_text(prompt, "achievement")
                     enhanced_achievement["description"] = enhanced_description
                 except:
                     pass
@@ -186,38 +223,39 @@ Skills: {', '.join(skills)}
 
 Skills overview:"""
                 
-                return await self._generate_text(prompt, max_length=100)
+                return await self._generate_text(prompt, "skills")
             except:
                 pass
         
         # Fallback description
         return f"Proficient in {', '.join(skills[:3])}{'and other relevant technologies' if len(skills) > 3 else ''}. Continuously expanding skill set through hands-on projects and coursework."
     
-    async def _generate_text(self, prompt: str, max_length: int = 100) -> str:
-        """Generate text using the AI model"""
+    async def _generate_text(self, prompt: str, section: str) -> str:
+        """Generate text for a portfolio section within its generation budget"""
         try:
-            inputs = self.tokenizer.encode(prompt, return_tensors="pt", truncation=True, max_length=512)
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    inputs,
-                    max_length=inputs.shape[1] + max_length,
-                    do_sample=True,
-                    temperature=0.7,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    num_return_sequences=1
-                )
-            
-            generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            limits = self.generation_limits[section]
+            inputs = self.tokenizer.encode(prompt, return_tensors=tensor_type(), truncation=True, max_length=512)
+            
+            outputs = await self.executor.run(
+                generate_tokens,
+                self.model_name,
+                inputs,
+                limits=limits,
+                do_sample=True,
+                temperature=0.7,
+                pad_token_id=self.tokenizer.eos_token_id,
+                num_return_sequences=1
+            )
             
             # Extract only the generated part
-            generated_part = generated_text[len(self.tokenizer.decode(inputs[0], skip_special_tokens=True)):].strip()
+            generated_ids = outputs[0][inputs.shape[1]:]
+            generated_part = self.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
             
             # Clean up the generated text
-            sentences = generated_part.split('.')
-            cleaned_text = '. '.join(sentences[:2]).strip()  # Take first 2 sentences
-            if cleaned_text and not cleaned_text.endswith('.'):
+            cleaned_text = first_sentences(generated_part, limits.max_sentences).strip()
+            if cleaned_text and not cleaned_text.endswith(('.', '!', '?')):
                 cleaned_text += '.'
+            self.generation_stats[section].record(describe_sequence(self.tokenizer, generated_ids.tolist(), cleaned_text, limits))
             
             return cleaned_text if cleaned_text else "Professional experience in relevant field."
             
@@ -0,0 +1,75 @@
+import heapq
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Tuple
+
+from text_processing import normalize_text
+
+# Sorts after every character a question can contain, closing a prefix range
+_PREFIX_END = "\uffff"
+
+
+class QuestionSuggester:
+    """Prefix autocomplete over canonical questions, ranked by popularity weight.
+
+    Questions are kept in one sorted array so a prefix maps to a contiguous range
+    found with two binary searches. Ranges larger than ``scan_limit`` (short,
+    common prefixes such as "w" or "how") have their top results precomputed at
+    build time, so no keystroke ever scans more than ``scan_limit`` candidates.
+    """
+
+    def __init__(self, questions: Iterable[Tuple[str, float]], max_results: int = 10, scan_limit: int = 256):
+        self.max_results = max_results
+        self.scan_limit = scan_limit
+
+        # Keep the most popular wording for questions that normalize identically
+        best: Dict[str, Tuple[str, float]] = {}
+        for question, weight in questions:
+            key = normalize_text(question)
+            if key and (key not in best or weight > best[key][1]):
+                best[key] = (question, weight)
+
+        self.keys = sorted(best)
+        self.questions = [best[key][0] for key in self.keys]
+        self.weights = [best[key][1] for key in self.keys]
+        self.prefix_top: Dict[str, List[int]] = {}
+        self._precompute_heavy_prefixes()
+
+    def _top_indexes(self, start: int, end: int, limit: int) -> List[int]:
+        """Return the indexes of the highest weighted questions in ``[start, end)``"""
+        return heapq.nlargest(limit, range(start, end), key=self.weights.__getitem__)
+
+    def _precompute_heavy_prefixes(self):
+        """Cache top results for every prefix whose range exceeds the scan limit"""
+        stack = [(0, len(self.keys), 0)]
+        while stack:
+            start, end, depth = stack.pop()
+            if end - start <= self.scan_limit:
+                continue
+            prefix = self.keys[start][:depth]
+            if depth:
+                self.prefix_top[prefix] = self._top_indexes(start, end, self.max_results)
+
+            # Split the range by the character following the shared prefix
+            position = start
+            while position < end and len(self.keys[position]) == depth:
+                position += 1
+            while position < end:
+                child_prefix = self.keys[position][:depth + 1]
+                child_end = bisect_left(self.keys, child_prefix + _PREFIX_END, position, end)
+                stack.append((position, child_end, depth + 1))
+                position = child_end
+
+    def suggest(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` questions starting with ``query``, most popular first"""
+        prefix = normalize_text(query)
+        if not prefix:
+            return []
+        limit = min(limit, self.max_results)
+
+        indexes = self.prefix_top.get(prefix)
+        if indexes is None:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + _PREFIX_END, start)
+            indexes = self._top_indexes(start, end, limit)
+
+        return [{"question": self.questions[i], "weight": self.weights[i]} for i in indexes[:limit]]
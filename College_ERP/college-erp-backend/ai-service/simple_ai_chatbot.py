@@ -1,274 +1,332 @@
 import asyncio
 import json
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+import zlib
+from typing import AsyncIterator, Dict, List, Optional, Any
 import re
+from pathlib import Path
+
+from chat_session import ChatSession
+from conversation_compaction import total_messages
+from conversation_locks import ConversationLocks
+from conversation_store import ConversationStore, create_conversation_store, decode_cursor, encode_cursor, format_summary
+from knowledge_base import KnowledgeBase, KnowledgeSnapshot
+from latency_stats import LatencyWindow
+from message_log import format_timestamp
+from response_cache import ResponseCache
+from text_processing import tokenize
+
+DATA_DIR = Path(__file__).parent / "data"
 
 class SimpleAIChatbot:
-    def __init__(self):
-        self.conversations = {}  # In-memory storage for conversations
+    def __init__(self, knowledge_path: Optional[str] = None, faq_path: Optional[str] = None,
+                 retrieval_threshold: float = 0.8, intent_engine: str = "keywords",
+                 intent_threshold: float = 0.2, reload_interval: float = 2.0,
+                 cache_size: int = 2048, cache_ttl: float = 600.0,
+                 conversation_store: Optional[ConversationStore] = None, sweep_interval: float = 60.0):
+        # Bounded conversation storage, swept for idle conversations in the background
+        self.conversations = conversation_store if conversation_store is not None else create_conversation_store()
+        if self.conversations.compactor is not None:
+            self.conversations.compactor.intent_tagger = self._message_intents
+        self.sweep_interval = sweep_interval
+        self._sweep_task = None
+        # Turns within one conversation run one at a time; different conversations run in parallel
+        self.conversation_locks = ConversationLocks()
         self.is_initialized = True  # Always ready since we're using rule-based responses
         
-        # College-specific context and knowledge base
-        self.college_context = {
-            "courses": ["Computer Science", "Electronics", "Mechanical", "Civil", "Electrical"],
-            "departments": ["CSE", "ECE", "ME", "CE", "EE"],
-            "facilities": ["Library", "Labs", "Cafeteria", "Sports Complex", "Auditorium"],
-            "services": ["Admission", "Examination", "Placement", "Library", "Transport"],
-            "timings": {
-                "library": "8 AM to 8 PM on weekdays, 9 AM to 5 PM on weekends",
-                "office": "9 AM to 5 PM on weekdays",
-                "labs": "9 AM to 6 PM on weekdays",
-                "cafeteria": "7 AM to 9 PM daily"
-            },
-            "contact": {
-                "admission": "+91-XXXX-XXXXXX",
-                "examination": "+91-XXXX-XXXXXX",
-                "placement": "+91-XXXX-XXXXXX",
-                "main": "+91-XXXX-XXXXXX"
-            }
-        }
+        # College context, response patterns, keyword tables, FAQ corpus and intent examples
+        # are loaded from files and hot-reloaded into compiled snapshots
+        self.knowledge_base = KnowledgeBase(
+            knowledge_path=Path(knowledge_path) if knowledge_path else DATA_DIR / "knowledge_base.json",
+            faq_path=Path(faq_path) if faq_path else DATA_DIR / "faq.json",
+            examples_path=DATA_DIR / "intent_examples.json",
+            intent_engine=intent_engine
+        )
+        self.reload_interval = reload_interval
+        self._watch_task = None
+        
+        # Answers below the retrieval threshold fall back to the response patterns
+        self.retrieval_threshold = retrieval_threshold
+        self.intent_engine = intent_engine
+        self.intent_threshold = intent_threshold
         
-        # Enhanced response patterns
-        self.response_patterns = self._initialize_response_patterns()
+        # Normalized message -> resolved intent and pre-formatted response pool
+        self.response_cache = ResponseCache(max_size=cache_size, ttl_seconds=cache_ttl)
+        
+        # Time from receiving a streamed request to sending its first text
+        self.first_token_latency = LatencyWindow()
+        
+        kb = self.knowledge_base.current
+        spell_stats = kb.intent_matcher.spell_index.stats()
+        print(f"Keyword typo index built in {spell_stats['build_time_ms']} ms "
+              f"({spell_stats['deletion_entries']} entries, ~{spell_stats['memory_bytes'] // 1024} KB)")
+        if kb.faq_retriever:
+            print(f"FAQ retrieval index built with {len(kb.faq_retriever.entries)} entries")
         
         print("Simple AI chatbot initialized successfully!")
     
-    def _initialize_response_patterns(self) -> Dict[str, List[str]]:
-        """Initialize comprehensive response patterns"""
-        return {
-            "greeting": [
-                "Hello! I'm your college AI assistant. I can help you with information about admissions, courses, facilities, examinations, and other college-related queries. How can I assist you today?",
-                "Hi there! Welcome to our college AI assistant. I'm here to help you with any questions about our institution. What would you like to know?",
-                "Greetings! I'm here to provide information about our college. Feel free to ask me about courses, admissions, facilities, or any other college-related topics."
-            ],
-            "admission": [
-                "For admission inquiries, please visit our admission office or check our college website for the latest admission criteria, dates, and procedures. You can also contact our admission helpline at {} for personalized assistance.",
-                "Admission process typically involves application submission, entrance examination (if applicable), and document verification. Visit our admission office for detailed information and current deadlines.",
-                "Our admission team is available to guide you through the entire process. Please bring your academic transcripts and required documents when visiting the admission office."
-            ],
-            "fees": [
-                "For fee-related queries, please contact the accounts department. Fee structure varies by course and semester. Payment can be made online through our student portal or at the accounts office.",
-                "Fee details are course-specific. Our accounts office provides detailed fee structure, scholarship information, and payment options. They're open from 9 AM to 5 PM on weekdays.",
-                "We offer various payment plans and scholarship opportunities. Contact the accounts department for personalized fee information and available financial assistance."
-            ],
-            "library": [
-                "Our library is open from {} and offers extensive digital and physical resources. Please carry your student ID for entry.",
-                "The library features study spaces, digital resources, research databases, and borrowing facilities. Quiet study areas and group discussion rooms are available.",
-                "Library services include book borrowing, digital access, printing facilities, and research assistance. Our librarians are available to help with research queries."
-            ],
-            "examination": [
-                "Examination schedules and results are available on the student portal. For any discrepancies or queries regarding results, please contact the examination department within the stipulated time frame.",
-                "The examination office handles all assessment-related matters including timetables, hall tickets, result processing, and transcript issuance.",
-                "For examination queries, visit the examination office with your student ID. They assist with result clarifications, re-evaluation requests, and transcript requests."
-            ],
-            "placement": [
-                "The placement cell actively works with industry partners to provide job opportunities. Regular training sessions, mock interviews, and career guidance are provided.",
-                "Our placement team conducts workshops on resume building, interview skills, and industry trends. Visit the placement office for registration and current opportunities.",
-                "Placement activities include campus recruitment drives, internship coordination, and career counseling. Students are encouraged to register early and participate in skill development programs."
-            ],
-            "courses": [
-                "We offer various undergraduate and postgraduate courses across multiple departments including {}. Course details, syllabus, and curriculum information are available in the academic section of our website.",
-                "Our academic departments provide comprehensive programs with modern curriculum and practical exposure. Each course is designed to meet industry requirements.",
-                "Course selection guidance is available through academic counselors. They help students choose suitable specializations based on their interests and career goals."
-            ],
-            "facilities": [
-                "Our campus features modern facilities including {}, well-equipped classrooms, and recreational areas.",
-                "Campus facilities are designed to support academic excellence and student well-being. All facilities are accessible and regularly maintained.",
-                "We provide state-of-the-art infrastructure including technology-enabled classrooms, research labs, and student amenities."
-            ],
-            "help": [
-                "I'm here to help! I can provide information about:\\n• Admissions and fees\\n• Courses and curriculum\\n• Examinations and results\\n• Library and facilities\\n• Placement and careers\\n• General college information\\n\\nWhat would you like to know?",
-                "I can assist you with various college-related topics. Ask me about admissions, courses, facilities, examination schedules, placement opportunities, or any other college information.",
-                "My knowledge covers all aspects of college life including academics, facilities, student services, and administrative procedures. Feel free to ask specific questions!"
-            ],
-            "default": [
-                "I understand you're asking about college-related matters. While I try my best to help, for specific or detailed queries, please contact the relevant department directly. Is there anything else I can help you with?",
-                "For detailed information on this topic, I recommend contacting the appropriate department directly. They can provide the most up-to-date and specific information you need.",
-                "I'd be happy to help with general information. For detailed or specific queries, please reach out to the concerned department for accurate assistance."
-            ]
-        }
+    def start_background_tasks(self):
+        """Start watching the knowledge base files and sweeping idle conversations"""
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self.knowledge_base.watch(self.reload_interval))
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self.conversations.run_sweeper(self.sweep_interval))
+    
+    async def stop_background_tasks(self):
+        """Stop the knowledge base watcher and the conversation sweeper, then flush conversation writes"""
+        for task in (self._watch_task, self._sweep_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._watch_task = None
+        self._sweep_task = None
+        await self.conversations.flush_async()
     
     def is_ready(self) -> bool:
         """Check if the AI model is ready"""
         return self.is_initialized
     
+    def suggest_questions(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Suggest canonical questions completing a partially typed message"""
+        return self.knowledge_base.current.question_suggester.suggest(query, limit)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics about the chatbot's in-memory indexes"""
+        spell_index = self.knowledge_base.current.intent_matcher.spell_index
+        return {
+            "conversations": self.conversations.stats(),
+            "conversation_locks": self.conversation_locks.stats(),
+            "knowledge_base": self.knowledge_base.stats(),
+            "response_cache": self.response_cache.stats(),
+            "time_to_first_token": self.first_token_latency.stats(),
+            "spell_index": spell_index.stats() if spell_index else None
+        }
+    
     async def generate_response(self, message: str, user_id: Optional[str] = None, conversation_id: Optional[str] = None) -> Dict[str, Any]:
         """Generate AI response to user message"""
+        return await self.respond(await self._get_or_create_conversation(user_id, conversation_id), message)
+    
+    async def open_session(self, user_id: Optional[str] = None, conversation_id: Optional[str] = None) -> ChatSession:
+        """Bind a long-lived connection to a conversation"""
+        return ChatSession(self, await self._get_or_create_conversation(user_id, conversation_id))
+    
+    async def respond(self, conversation: Dict[str, Any], message: str) -> Dict[str, Any]:
+        """Run one chat turn in an already resolved conversation"""
+        async with self.conversation_locks.hold(conversation["id"]):
+            await self._add_user_message(conversation, message)
+            
+            # One knowledge snapshot serves the whole request, even if a reload lands meanwhile
+            kb = self.knowledge_base.current
+            resolved = self._resolve_cached(message, kb)
+            response_text = self._select_response(resolved, conversation)
+            
+            return await self._finish_turn(conversation, response_text, resolved["confidence"])
+    
+    async def stream_response(self, message: str, user_id: Optional[str] = None, conversation_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a response as stream events; rule-based replies arrive as a single chunk"""
+        started = time.perf_counter()
+        conversation = await self._get_or_create_conversation(user_id, conversation_id)
+        yield {"type": "start", "conversation_id": conversation["id"]}
         
-        # Create conversation ID if not provided
-        if not conversation_id:
-            conversation_id = str(uuid.uuid4())
+        result = await self.respond(conversation, message)
+        self.first_token_latency.record(time.perf_counter() - started)
+        yield {"type": "token", "text": result["response"]}
+        yield {"type": "done", **result}
+    
+    async def generate_responses(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate responses for many messages at once, returned in input order.
         
-        # Initialize conversation if it doesn't exist
-        if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = {
-                "id": conversation_id,
-                "user_id": user_id,
-                "messages": [],
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
+        Each distinct message is resolved once, and cache misses are classified together.
+        A failing item yields an ``error`` entry instead of failing the whole batch.
+        """
+        kb = self.knowledge_base.current
+        normalized = [" ".join(tokenize(request["message"])) for request in requests]
+        resolved = self._resolve_batch(list(dict.fromkeys(normalized)), kb)
         
-        # Add user message to conversation
-        self.conversations[conversation_id]["messages"].append({
-            "role": "user",
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        })
+        results = []
+        # Hold every conversation of the batch, so no other turn interleaves with it;
+        # items in the same conversation run in input order under the one lock
+        conversation_ids = [request["conversation_id"] for request in requests if request.get("conversation_id")]
+        async with self.conversation_locks.hold_all(conversation_ids):
+            for request, text in zip(requests, normalized):
+                try:
+                    conversation = await self._get_or_create_conversation(request.get("user_id"), request.get("conversation_id"))
+                    await self._add_user_message(conversation, request["message"])
+                    response_text = self._select_response(resolved[text], conversation)
+                    results.append(await self._finish_turn(conversation, response_text, resolved[text]["confidence"]))
+                except Exception as e:
+                    results.append({"error": f"Error generating chat response: {str(e)}"})
+        return results
+    
+    async def _get_or_create_conversation(self, user_id: Optional[str], conversation_id: Optional[str]) -> Dict[str, Any]:
+        """Look up a conversation, creating it if needed"""
         
-        # Generate response using enhanced pattern matching
-        response_text = self._generate_enhanced_response(message, conversation_id)
+        # Create conversation ID if not provided
+        if not conversation_id:
+            conversation_id = str(uuid.uuid4())
         
-        # Add AI response to conversation
-        self.conversations[conversation_id]["messages"].append({
-            "role": "assistant",
-            "content": response_text,
-            "timestamp": datetime.now().isoformat()
-        })
+        return await self.conversations.get_or_create_async(conversation_id, user_id)
+    
+    async def _add_user_message(self, conversation: Dict[str, Any], message: str):
+        """Add user message to conversation"""
+        await self.conversations.append_message_async(conversation, "user", message)
+    
+    async def _finish_turn(self, conversation: Dict[str, Any], response_text: str, confidence: Optional[float]) -> Dict[str, Any]:
+        """Record the assistant's reply and build the API response"""
         
-        # Update conversation timestamp
-        self.conversations[conversation_id]["updated_at"] = datetime.now().isoformat()
+        # Add AI response to conversation; the store updates the conversation timestamp
+        message = await self.conversations.append_message_async(conversation, "assistant", response_text)
         
         return {
             "response": response_text,
-            "conversation_id": conversation_id,
-            "timestamp": datetime.now().isoformat()
+            "conversation_id": conversation["id"],
+            "timestamp": message.timestamp,
+            "confidence": confidence
         }
     
-    def _generate_enhanced_response(self, message: str, conversation_id: str) -> str:
-        """Generate enhanced response using improved pattern matching"""
-        message_lower = message.lower()
-        
-        # Analyze message context
-        context = self._analyze_message_context(message_lower)
-        
-        # Check for greetings
-        if any(greeting in message_lower for greeting in ["hello", "hi", "hey", "greetings", "good morning", "good afternoon", "good evening"]):
-            return self._get_random_response("greeting")
-        
-        # Check for help requests
-        if any(help_word in message_lower for help_word in ["help", "assist", "support", "guide"]):
-            return self._get_random_response("help")
-        
-        # Context-based responses
-        if context["admission"]:
-            response = self._get_random_response("admission")
-            if "{}" in response:
-                return response.format(self.college_context["contact"]["admission"])
-            return response
-        
-        if context["fees"]:
-            return self._get_random_response("fees")
+    def _resolve_cached(self, message: str, kb: KnowledgeSnapshot) -> Dict[str, Any]:
+        """Resolve a message through the response cache"""
+        normalized = " ".join(tokenize(message))
+        # Keying on the snapshot version drops stale entries after a knowledge base reload
+        key = (kb.version, normalized)
+        resolved = self.response_cache.get(key)
+        if resolved is None:
+            resolved = self._resolve_response(normalized, kb)
+            self.response_cache.put(key, resolved)
+        return resolved
+    
+    def _resolve_batch(self, messages: List[str], kb: KnowledgeSnapshot) -> Dict[str, Dict[str, Any]]:
+        """Resolve distinct normalized messages, classifying all cache misses in one batch"""
+        resolved = {}
+        misses = []
+        for message in messages:
+            cached = self.response_cache.get((kb.version, message))
+            if cached is None:
+                misses.append(message)
+            else:
+                resolved[message] = cached
         
-        if context["library"]:
-            response = self._get_random_response("library")
-            if "{}" in response:
-                return response.format(self.college_context["timings"]["library"])
-            return response
+        contexts: List[Optional[Dict[str, bool]]] = [None] * len(misses)
+        if kb.intent_classifier and misses:
+            contexts = [
+                self._context_from_classification(intent, score, kb)
+                for intent, score in kb.intent_classifier.classify_batch(misses)
+            ]
         
-        if context["examination"]:
-            return self._get_random_response("examination")
+        for message, context in zip(misses, contexts):
+            resolved[message] = self._resolve_response(message, kb, context)
+            self.response_cache.put((kb.version, message), resolved[message])
+        return resolved
+    
+    def _resolve_response(self, message: str, kb: KnowledgeSnapshot, context: Optional[Dict[str, bool]] = None) -> Dict[str, Any]:
+        """Resolve a normalized message to its intent and pool of candidate responses"""
         
-        if context["placement"]:
-            return self._get_random_response("placement")
+        # Answer from the FAQ corpus when retrieval is confident, otherwise use pattern matching
+        faq_match = kb.faq_retriever.best_match(message) if kb.faq_retriever else None
+        if faq_match and faq_match["confidence"] >= self.retrieval_threshold:
+            return {"intent": "faq", "responses": (faq_match["answer"],), "confidence": faq_match["confidence"]}
         
-        if context["courses"]:
-            response = self._get_random_response("courses")
-            if "{}" in response:
-                return response.format(", ".join(self.college_context["courses"]))
-            return response
+        # Analyze message context
+        if context is None:
+            context = self._analyze_message_context(message, kb)
         
-        if context["facilities"]:
-            response = self._get_random_response("facilities")
-            if "{}" in response:
-                return response.format(", ".join(self.college_context["facilities"]))
-            return response
+        # Greetings and help requests come first, then the context-based responses
+        for intent in ("greeting", "help", "admission", "fees", "library", "examination", "placement", "courses", "facilities"):
+            if context[intent]:
+                return {"intent": intent, "responses": kb.formatted_patterns[intent], "confidence": None}
         
         # Handle specific queries about timings
-        if "timing" in message_lower or "time" in message_lower or "open" in message_lower or "close" in message_lower:
-            return self._handle_timing_query(message_lower)
+        if context["timing"]:
+            return {"intent": "timing", "responses": (self._handle_timing_query(message, kb),), "confidence": None}
         
         # Handle contact information queries
-        if "contact" in message_lower or "phone" in message_lower or "number" in message_lower:
-            return self._handle_contact_query(message_lower)
+        if context["contact"]:
+            return {"intent": "contact", "responses": (self._handle_contact_query(message, kb),), "confidence": None}
+        
+        return {"intent": "default", "responses": kb.formatted_patterns["default"], "confidence": None}
+    
+    def _select_response(self, resolved: Dict[str, Any], conversation: Dict[str, Any]) -> str:
+        """Pick a response from the resolved pool, rotating deterministically per conversation"""
+        message_count = total_messages(conversation["messages"])
         
         # Default response with some personalization
-        return self._get_personalized_default_response(message, conversation_id)
+        if resolved["intent"] == "default" and message_count > 4:  # Longer conversation
+            return "I appreciate your continued questions! While I aim to be helpful, for detailed or technical queries, please consider contacting the specific department directly. They can provide the most accurate and up-to-date information. Is there anything else I can help you with today?"
+        
+        responses = resolved["responses"]
+        turn = message_count // 2
+        return responses[(zlib.crc32(conversation["id"].encode("utf-8")) + turn) % len(responses)]
     
-    def _analyze_message_context(self, message: str) -> Dict[str, bool]:
-        """Analyze message to determine context"""
-        return {
-            "admission": any(word in message for word in ["admission", "admit", "apply", "application", "join", "enroll"]),
-            "fees": any(word in message for word in ["fee", "fees", "payment", "cost", "amount", "money", "pay"]),
-            "library": any(word in message for word in ["library", "book", "books", "study", "reading"]),
-            "examination": any(word in message for word in ["exam", "examination", "result", "grade", "marks", "test", "assessment"]),
-            "placement": any(word in message for word in ["placement", "job", "career", "interview", "company", "recruit"]),
-            "courses": any(word in message for word in ["course", "courses", "subject", "curriculum", "program", "degree"]),
-            "facilities": any(word in message for word in ["facility", "facilities", "campus", "infrastructure", "amenities"])
-        }
+    def _message_intents(self, message: str) -> List[str]:
+        """List the intents a message expresses, for conversation summaries"""
+        return list(self.knowledge_base.current.intent_matcher.match(message))
+    
+    def _analyze_message_context(self, message: str, kb: KnowledgeSnapshot) -> Dict[str, bool]:
+        """Analyze message to determine context in a single matcher pass"""
+        if kb.intent_classifier:
+            intent, score = kb.intent_classifier.classify(message)
+            return self._context_from_classification(intent, score, kb)
+        
+        matches = kb.intent_matcher.match(message)
+        return {intent: intent in matches for intent in kb.intent_matcher.intents}
+    
+    def _context_from_classification(self, intent: str, score: float, kb: KnowledgeSnapshot) -> Dict[str, bool]:
+        """Turn a classifier prediction into the same context flags the keyword matcher produces"""
+        return {name: name == intent and score >= self.intent_threshold for name in kb.intent_matcher.intents}
     
-    def _handle_timing_query(self, message: str) -> str:
+    def _handle_timing_query(self, message: str, kb: KnowledgeSnapshot) -> str:
         """Handle specific timing queries"""
         if "library" in message:
-            return f"The library is open {self.college_context['timings']['library']}. Please carry your student ID for entry."
+            return f"The library is open {kb.college_context['timings']['library']}. Please carry your student ID for entry."
         elif "office" in message:
-            return f"Office hours are {self.college_context['timings']['office']}. Please visit during these hours for administrative work."
+            return f"Office hours are {kb.college_context['timings']['office']}. Please visit during these hours for administrative work."
         elif "lab" in message:
-            return f"Laboratory access is available {self.college_context['timings']['labs']}. Specific lab timings may vary by department."
+            return f"Laboratory access is available {kb.college_context['timings']['labs']}. Specific lab timings may vary by department."
         elif "cafeteria" in message:
-            return f"Our cafeteria operates {self.college_context['timings']['cafeteria']}, offering various meal options throughout the day."
+            return f"Our cafeteria operates {kb.college_context['timings']['cafeteria']}, offering various meal options throughout the day."
         else:
             return "Our main facilities operate from 9 AM to 5 PM on weekdays. Specific timings may vary for different services. Please ask about a particular facility for exact timings."
     
-    def _handle_contact_query(self, message: str) -> str:
+    def _handle_contact_query(self, message: str, kb: KnowledgeSnapshot) -> str:
         """Handle contact information queries"""
         if "admission" in message:
-            return f"For admission queries, contact our admission office at {self.college_context['contact']['admission']} or visit during office hours."
+            return f"For admission queries, contact our admission office at {kb.college_context['contact']['admission']} or visit during office hours."
         elif "examination" in message or "result" in message:
-            return f"For examination-related queries, contact the examination office at {self.college_context['contact']['examination']}."
+            return f"For examination-related queries, contact the examination office at {kb.college_context['contact']['examination']}."
         elif "placement" in message or "job" in message:
-            return f"For placement and career guidance, reach out to our placement cell at {self.college_context['contact']['placement']}."
+            return f"For placement and career guidance, reach out to our placement cell at {kb.college_context['contact']['placement']}."
         else:
-            return f"For general inquiries, you can contact our main office at {self.college_context['contact']['main']} or visit the information desk on campus."
+            return f"For general inquiries, you can contact our main office at {kb.college_context['contact']['main']} or visit the information desk on campus."
     
-    def _get_random_response(self, category: str) -> str:
-        """Get a random response from the specified category"""
-        import random
-        responses = self.response_patterns.get(category, self.response_patterns["default"])
-        return random.choice(responses)
-    
-    def _get_personalized_default_response(self, message: str, conversation_id: str) -> str:
-        """Generate a personalized default response"""
-        conversation = self.conversations.get(conversation_id, {})
-        message_count = len(conversation.get("messages", []))
+    async def get_user_conversations(self, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of a user's conversations, most recently updated first"""
+        before = decode_cursor(cursor) if cursor else None
         
-        if message_count > 4:  # Longer conversation
-            return "I appreciate your continued questions! While I aim to be helpful, for detailed or technical queries, please consider contacting the specific department directly. They can provide the most accurate and up-to-date information. Is there anything else I can help you with today?"
-        else:
-            return self._get_random_response("default")
-    
-    async def get_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all conversations for a specific user"""
-        user_conversations = []
-        for conv_id, conv_data in self.conversations.items():
-            if conv_data.get("user_id") == user_id:
-                # Return conversation summary
-                summary = {
-                    "id": conv_id,
-                    "created_at": conv_data["created_at"],
-                    "updated_at": conv_data["updated_at"],
-                    "message_count": len(conv_data["messages"]),
-                    "preview": conv_data["messages"][0]["content"][:100] if conv_data["messages"] else ""
-                }
-                user_conversations.append(summary)
+        # Summaries come from the store; fetch one extra to learn whether another page follows
+        page = await self.conversations.user_conversations_async(user_id, limit=limit + 1 if limit else None, before=before)
+        has_more = limit is not None and len(page) > limit
+        if has_more:
+            page = page[:limit]
         
-        return sorted(user_conversations, key=lambda x: x["updated_at"], reverse=True)
+        next_cursor = encode_cursor((page[-1]["updated_at"], page[-1]["id"])) if has_more else None
+        return {"conversations": [format_summary(summary) for summary in page], "next_cursor": next_cursor}
+    
+    async def search_conversations(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search a user's past messages, best matches first"""
+        results = await self.conversations.search_async(user_id, query, limit)
+        for result in results:
+            result["timestamp"] = format_timestamp(result["timestamp"])
+        return results
+    
+    def export_conversations(self, user_id: Optional[str] = None, since: Optional[int] = None,
+                             until: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream full conversations last updated within [since, until), as export records"""
+        return self.conversations.export(user_id, since, until)
     
     async def delete_conversation(self, conversation_id: str) -> bool:
         """Delete a specific conversation"""
-        if conversation_id in self.conversations:
-            del self.conversations[conversation_id]
-            return True
-        return False
\ No newline at end of file
+        return await self.conversations.delete_async(conversation_id)
\ No newline at end of file
@@ -22,6 +22,14 @@ class SimplePortfolioGenerator:
         """Check if the generator is ready"""
         return self.is_initialized
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the generator's state; template-based generation has no model or token counts"""
+        return {
+            "model": None,
+            "model_ready": self.is_initialized,
+            "generation": {}
+        }
+    
     async def generate_portfolio(self, student_record: Any, template_style: str = "professional") -> Dict[str, Any]:
         """Generate a complete portfolio for a student"""
         
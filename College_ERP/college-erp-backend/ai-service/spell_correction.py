@@ -0,0 +1,152 @@
+import sys
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """Return every string obtained by deleting up to ``max_distance`` characters from ``word``"""
+    results: Set[str] = set()
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for candidate in frontier:
+            for i in range(len(candidate)):
+                deleted = candidate[:i] + candidate[i + 1:]
+                if deleted not in results:
+                    results.add(deleted)
+                    next_frontier.add(deleted)
+        frontier = next_frontier
+    return results
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Return True if ``a`` and ``b`` differ by at most one insertion, deletion, substitution or transposition"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    if len(a) == len(b):
+        if a[prefix + 1:] == b[prefix + 1:]:
+            return True
+        # Adjacent transposition
+        return a[prefix:prefix + 2] == b[prefix:prefix + 2][::-1] and a[prefix + 2:] == b[prefix + 2:]
+    if len(a) > len(b):
+        return a[prefix + 1:] == b[prefix:]
+    return a[prefix:] == b[prefix + 1:]
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance between ``a`` and ``b``, or ``limit + 1`` if it exceeds ``limit``"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        row_minimum = i
+        a_char = a[i - 1]
+        for j in range(1, len(b) + 1):
+            value = previous[j - 1] if a_char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and a_char == b[j - 2] and a[i - 2] == b[j - 1] and previous_previous[j - 2] + 1 < value:
+                value = previous_previous[j - 2] + 1
+            current.append(value)
+            if value < row_minimum:
+                row_minimum = value
+        if row_minimum > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class DeletionIndex:
+    """SymSpell-style typo index resolving misspelled tokens to canonical keywords.
+
+    Every keyword's deletion neighborhood (all strings reachable by deleting up to
+    ``max_edit_distance`` characters) is precomputed into a hash table. A misspelled
+    token is resolved by generating its own deletion neighborhood and looking each
+    variant up, so the cost is independent of the number of keywords; only the few
+    candidates found are verified with an edit distance.
+
+    Short tokens are never corrected and the first letter must match, which keeps
+    ordinary words such as "most" or "looks" from being "corrected" into keywords.
+    Tokens in ``known_words``, correctly spelled words that merely resemble a
+    keyword (such as "contract" for "contact"), are never corrected either.
+    """
+
+    def __init__(self, words: Iterable[str], max_edit_distance: int = 2, min_word_length: int = 5,
+                 known_words: Iterable[str] = ()):
+        start = time.perf_counter()
+        self.max_edit_distance = max_edit_distance
+        self.min_word_length = min_word_length
+        self.words = frozenset(word for word in words if word)
+        self.known_words = frozenset(known_words) - self.words
+        self.deletes: Dict[str, List[str]] = {}
+
+        for word in sorted(self.words):
+            if len(word) < self.min_word_length - self.max_edit_distance:
+                continue
+            for variant in _deletes(word, self.max_edit_distance) | {word}:
+                self.deletes.setdefault(variant, []).append(word)
+
+        self.build_time_ms = (time.perf_counter() - start) * 1000
+        self.memory_bytes = self._estimate_memory()
+        self.lookup = lru_cache(maxsize=16384)(self._lookup)
+
+    def _estimate_memory(self) -> int:
+        """Approximate the memory held by the deletion table"""
+        total = sys.getsizeof(self.deletes)
+        for variant, words in self.deletes.items():
+            total += sys.getsizeof(variant) + sys.getsizeof(words)
+        return total
+
+    def _allowed_distance(self, token: str) -> int:
+        """Longer tokens tolerate more typos"""
+        return min(self.max_edit_distance, 1 if len(token) < 8 else 2)
+
+    def _lookup(self, token: str) -> Optional[str]:
+        """Return the canonical keyword for ``token``, or None if there is no close match"""
+        if token in self.words:
+            return token
+        if len(token) < self.min_word_length or token in self.known_words:
+            return None
+
+        # Search outward one deletion at a time: every keyword within distance d is
+        # reachable from the token's deletes up to depth d, so closer matches end the search early
+        limit = self._allowed_distance(token)
+        variants = {token}
+        checked: Set[str] = set()
+        best_word, best_distance = None, limit + 1
+        for depth in range(limit + 1):
+            if depth:
+                variants = {variant[:i] + variant[i + 1:] for variant in variants for i in range(len(variant))}
+            candidates = {
+                word for variant in variants for word in self.deletes.get(variant, ())
+                if word[0] == token[0] and word not in checked
+            }
+            checked.update(candidates)
+
+            for word in sorted(candidates):
+                distance = 1 if _within_one_edit(token, word) else _edit_distance(token, word, limit)
+                if distance < best_distance:
+                    best_word, best_distance = word, distance
+            if best_distance <= max(depth, 1):
+                return best_word
+        return best_word
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size, build time and approximate memory footprint"""
+        return {
+            "keywords": len(self.words),
+            "known_words": len(self.known_words),
+            "deletion_entries": len(self.deletes),
+            "build_time_ms": round(self.build_time_ms, 2),
+            "memory_bytes": self.memory_bytes
+        }
@@ -0,0 +1,569 @@
+import asyncio
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from conversation_compaction import ConversationCompactor, conversation_preview, total_messages
+from conversation_store import EXPORT_PAGE_SIZE, ConversationStore, ListingKey, export_record
+from text_processing import content_tokens
+from message_log import MessageLog, MessageRecord, now_us
+
+logger = logging.getLogger(__name__)
+
+# Seconds the writer waits before retrying a failed group commit, multiplied by the attempt number
+WRITE_RETRY_DELAY = 0.05
+
+# Times get_async re-reads a conversation that changed while it was being read, before reading it in place
+READ_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    preview TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations (updated_at, id);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (user_id, content, tokenize = 'porter unicode61');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, user_id, content)
+    VALUES (new.id, (SELECT user_id FROM conversations WHERE id = new.conversation_id), new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    DELETE FROM messages_fts WHERE rowid = old.id;
+END;
+"""
+
+UPSERT_CONVERSATION = """
+INSERT INTO conversations (id, user_id, created_at, updated_at, preview, message_count)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    updated_at = excluded.updated_at,
+    message_count = message_count + excluded.message_count
+"""
+
+INSERT_MESSAGE = "INSERT INTO messages (conversation_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+
+SEARCH_MESSAGES = """
+SELECT m.conversation_id, m.role, m.timestamp, snippet(messages_fts, 1, '', '', '…', 24), bm25(messages_fts, 0.0, 1.0) AS rank
+FROM messages_fts
+JOIN messages m ON m.id = messages_fts.rowid
+JOIN conversations c ON c.id = m.conversation_id
+WHERE messages_fts MATCH ? AND c.user_id = ?
+ORDER BY rank
+LIMIT ?
+"""
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Durable conversation store on a local SQLite database in WAL mode.
+
+    Several worker processes can open the same database file: WAL lets readers
+    proceed while one writer commits. Message appends are write-behind: they are
+    applied to an in-process cache immediately and queued for a writer thread that
+    group-commits everything that arrived within ``flush_interval`` seconds in one
+    transaction. The queue holds at most ``max_queue`` writes; when it is full,
+    appends wait until the writer catches up. A failed commit is retried up to
+    ``write_attempts`` times; appends that still fail are dropped and the error is
+    raised by the next ``flush``.
+
+    The ``*_async`` methods are for callers on the event loop: they read the
+    database in a worker thread and await the writer instead of blocking on it.
+
+    Reads stay read-your-writes within a conversation: a cached conversation is
+    reused while its length matches the committed message count plus the appends
+    still queued, and otherwise is reloaded from the database with the queued
+    appends laid on top. Message text is also indexed in an FTS5 table, kept in
+    step with the messages table by triggers, for history search.
+
+    Compaction only applies to the cached copy of a conversation and never folds
+    appends that are still queued; the database keeps the full history for search
+    and export.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.02, max_queue: int = 10000,
+                 max_batch: int = 1000, max_cached: int = 1024, idle_ttl: float = 3600.0,
+                 compactor: Optional[ConversationCompactor] = None, write_attempts: int = 3):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.write_attempts = write_attempts
+        self.max_batch = max_batch
+        self.max_cached = max_cached
+        self.idle_ttl = idle_ttl
+        self.compactor = compactor
+
+        self._reader = self._connect()
+        self._reader.executescript(SCHEMA)
+
+        # Conversation id -> (conversation, last access in monotonic seconds), in LRU order
+        self._cache: "OrderedDict[str, list]" = OrderedDict()
+
+        # Appends accepted but not yet committed, per conversation; guarded by _lock together
+        # with commits so a reader never sees a commit without the matching pending decrement
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        # Held by async writers waiting for room in a full queue, so later writes queue up behind them in order
+        self._put_lock = asyncio.Lock()
+        self.commits = 0
+        self.messages_written = 0
+        self.write_errors = 0
+        self.messages_dropped = 0
+        # Error of the last dropped batch not yet raised by a flush; only touched by the writer thread
+        self._write_failure: Optional[sqlite3.Error] = None
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection configured for concurrent use by several processes"""
+        connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(conversation_id)
+        return self._apply(conversation_id, entry, *self._read(conversation_id, self._cached_length(entry)))
+
+    async def get_async(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        # The snapshot read in the worker thread is applied only if no append or commit touched the
+        # conversation meanwhile; otherwise it would not line up with the cached copy
+        for _ in range(READ_ATTEMPTS):
+            entry = self._cache.get(conversation_id)
+            known_length = self._cached_length(entry)
+            row, stored, pending = await asyncio.to_thread(self._read, conversation_id, known_length)
+            with self._lock:
+                unchanged = self._pending.get(conversation_id, 0) == pending
+            if unchanged and self._cache.get(conversation_id) is entry and self._cached_length(entry) == known_length:
+                return self._apply(conversation_id, entry, row, stored, pending)
+        return self.get(conversation_id)
+
+    def get_or_create(self, conversation_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        return self.get(conversation_id) or self._create(conversation_id, user_id)
+
+    async def get_or_create_async(self, conversation_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        conversation = await self.get_async(conversation_id)
+        if conversation is None:
+            # Another turn may have created it while the database was being read
+            entry = self._cache.get(conversation_id)
+            conversation = entry[0] if entry else self._create(conversation_id, user_id)
+        return conversation
+
+    def append_message(self, conversation: Dict[str, Any], role: str, content: str) -> MessageRecord:
+        message, write = self._stage_append(conversation, role, content)
+        self._queue.put(write)
+        return message
+
+    async def append_message_async(self, conversation: Dict[str, Any], role: str, content: str) -> MessageRecord:
+        message, write = self._stage_append(conversation, role, content)
+        await self._put_async(write)
+        return message
+
+    def _stage_append(self, conversation: Dict[str, Any], role: str, content: str) -> Tuple[MessageRecord, tuple]:
+        """Apply an append to the cached conversation, returning the message and its queued write"""
+        message = conversation["messages"].append(role, content, now_us())
+        conversation["updated_at"] = message.timestamp_us
+
+        conversation_id = conversation["id"]
+        entry = self._cache.get(conversation_id)
+        if entry is None or entry[0] is not conversation:
+            self._cache_put(conversation)
+        else:
+            self._touch(conversation_id, entry)
+
+        with self._lock:
+            pending = self._pending[conversation_id] = self._pending.get(conversation_id, 0) + 1
+        self._compact(conversation["messages"], pending)
+        return message, ("append", (
+            conversation_id, conversation["user_id"], conversation["created_at"], message.timestamp_us,
+            conversation_preview(conversation["messages"]), role, content
+        ))
+
+    def delete(self, conversation_id: str) -> bool:
+        self._cache.pop(conversation_id, None)
+        return self._call(lambda connection: self._delete(connection, conversation_id))
+
+    async def delete_async(self, conversation_id: str) -> bool:
+        self._cache.pop(conversation_id, None)
+        return await self._call_async(lambda connection: self._delete(connection, conversation_id))
+
+    def user_conversations(self, user_id: str, limit: Optional[int] = None,
+                           before: Optional[ListingKey] = None) -> List[Dict[str, Any]]:
+        if self._has_pending(user_id):
+            self.flush()
+        return self._select_user_conversations(user_id, limit, before)
+
+    async def user_conversations_async(self, user_id: str, limit: Optional[int] = None,
+                                       before: Optional[ListingKey] = None) -> List[Dict[str, Any]]:
+        if self._has_pending(user_id):
+            await self.flush_async()
+        return await asyncio.to_thread(self._select_user_conversations, user_id, limit, before)
+
+    def search(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        terms = content_tokens(query)
+        if not terms:
+            return []
+        if self._has_pending(user_id):
+            self.flush()
+        return self._select_messages(user_id, terms, limit)
+
+    async def search_async(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        terms = content_tokens(query)
+        if not terms:
+            return []
+        if self._has_pending(user_id):
+            await self.flush_async()
+        return await asyncio.to_thread(self._select_messages, user_id, terms, limit)
+
+    def _select_user_conversations(self, user_id: str, limit: Optional[int],
+                                   before: Optional[ListingKey]) -> List[Dict[str, Any]]:
+        """Read a page of a user's conversation summaries from the database"""
+        query = "SELECT id, created_at, updated_at, message_count, preview FROM conversations WHERE user_id = ?"
+        params: list = [user_id]
+        if before is not None:
+            query += " AND (updated_at, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY updated_at DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._reader.execute(query, params).fetchall()
+        return [
+            {"id": row[0], "created_at": row[1], "updated_at": row[2], "message_count": row[3], "preview": row[4]}
+            for row in rows
+        ]
+
+    def _select_messages(self, user_id: str, terms: List[str], limit: int) -> List[Dict[str, Any]]:
+        """Run a full-text search over a user's messages in the database"""
+        # The user_id column narrows the full-text match; the join then checks the owner exactly
+        match = "content : (" + " OR ".join('"' + term + '"' for term in terms) + ")"
+        if re.search(r"\w", user_id):
+            match = 'user_id : "' + user_id.replace('"', '""') + '" AND ' + match
+
+        with self._lock:
+            rows = self._reader.execute(SEARCH_MESSAGES, (match, user_id, limit)).fetchall()
+        return [
+            {"conversation_id": row[0], "role": row[1], "timestamp": row[2], "snippet": row[3], "score": round(-row[4], 4)}
+            for row in rows
+        ]
+
+    async def export(self, user_id: Optional[str] = None, since: Optional[int] = None,
+                     until: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        # Pages are read in a worker thread on a dedicated connection, walking (updated_at, id) keyset order
+        await self.flush_async()
+        connection = self._connect()
+        try:
+            after: Optional[ListingKey] = None
+            while True:
+                records, after = await asyncio.to_thread(self._export_page, connection, user_id, since, until, after)
+                for record in records:
+                    yield record
+                if after is None:
+                    break
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Block until every write accepted so far is committed, raising the error of any dropped since the last flush"""
+        self._call(self._check_writes)
+
+    async def flush_async(self):
+        await self._call_async(self._check_writes)
+
+    def sweep(self) -> int:
+        """Drop cached conversations idle for longer than the TTL; they stay in the database"""
+        deadline = time.monotonic() - self.idle_ttl
+        evicted = 0
+        for conversation_id, (_, last_access) in list(self._cache.items()):
+            if last_access > deadline:
+                break
+            if conversation_id not in self._pending:
+                del self._cache[conversation_id]
+                evicted += 1
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(self._pending.values())
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "conversations": len(self),
+            "cached": len(self._cache),
+            "queued_writes": self._queue.qsize(),
+            "pending_messages": pending,
+            "commits": self.commits,
+            "messages_written": self.messages_written,
+            "average_batch": round(self.messages_written / self.commits, 1) if self.commits else 0.0,
+            "write_errors": self.write_errors,
+            "messages_dropped": self.messages_dropped,
+            "compaction": self.compactor.stats() if self.compactor else None
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._reader.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def _export_page(self, connection: sqlite3.Connection, user_id: Optional[str], since: Optional[int],
+                     until: Optional[int], after: Optional[ListingKey]) -> Tuple[List[Dict[str, Any]], Optional[ListingKey]]:
+        """Read one export page, returning its records and the keyset position of the next page"""
+        query = "SELECT id, user_id, created_at, updated_at FROM conversations WHERE 1 = 1"
+        params: list = []
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if since is not None:
+            query += " AND updated_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND updated_at < ?"
+            params.append(until)
+        if after is not None:
+            query += " AND (updated_at, id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY updated_at, id LIMIT ?"
+        params.append(EXPORT_PAGE_SIZE)
+
+        rows = connection.execute(query, params).fetchall()
+        records = [
+            export_record(conversation_id, owner, created_at, updated_at, connection.execute(
+                "SELECT role, content, timestamp FROM messages WHERE conversation_id = ? ORDER BY id",
+                (conversation_id,)
+            ))
+            for conversation_id, owner, created_at, updated_at in rows
+        ]
+        next_after = (rows[-1][3], rows[-1][0]) if len(rows) == EXPORT_PAGE_SIZE else None
+        return records, next_after
+
+    def _has_pending(self, user_id: str) -> bool:
+        """Whether a user has queued appends, to flush before a query that reads their rows from the database"""
+        with self._lock:
+            return any(self._cache[conversation_id][0]["user_id"] == user_id
+                       for conversation_id in self._pending if conversation_id in self._cache)
+
+    @staticmethod
+    def _cached_length(entry: Optional[list]) -> Optional[int]:
+        """Message count of a cached conversation, or None when it is not cached"""
+        return total_messages(entry[0]["messages"]) if entry else None
+
+    def _read(self, conversation_id: str, known_length: Optional[int]) -> Tuple[Optional[tuple], Optional[list], int]:
+        """Read a conversation's row and pending count, and its messages unless ``known_length`` is current"""
+        with self._lock:
+            row = self._reader.execute(
+                "SELECT user_id, created_at, updated_at, message_count FROM conversations WHERE id = ?",
+                (conversation_id,)
+            ).fetchone()
+            pending = self._pending.get(conversation_id, 0)
+            stored = None
+            if row is not None and known_length != row[3] + pending:
+                stored = self._reader.execute(
+                    "SELECT role, content, timestamp FROM messages WHERE conversation_id = ? ORDER BY id",
+                    (conversation_id,)
+                ).fetchall()
+        return row, stored, pending
+
+    def _apply(self, conversation_id: str, entry: Optional[list], row: Optional[tuple], stored: Optional[list],
+               pending: int) -> Optional[Dict[str, Any]]:
+        """Reconcile the cached copy of a conversation with what was read from the database"""
+        cached = entry[0] if entry else None
+        if row is None:
+            # Created here but not flushed yet, or deleted by another worker
+            if cached is not None and (pending or not cached["messages"]):
+                self._touch(conversation_id, entry)
+                return cached
+            self._cache.pop(conversation_id, None)
+            return None
+
+        if stored is not None:
+            # Another worker appended to this conversation; reload it, keeping local queued appends last
+            if cached is None:
+                cached = {"id": conversation_id, "user_id": row[0], "messages": MessageLog(), "created_at": row[1], "updated_at": row[2]}
+            queued = cached["messages"][-pending:] if pending else []
+            cached["messages"].clear()
+            for message in stored + queued:
+                cached["messages"].append(*message)
+            self._compact(cached["messages"], pending)
+            if not pending:
+                cached["updated_at"] = row[2]
+            self._cache_put(cached)
+        else:
+            self._touch(conversation_id, entry)
+        return cached
+
+    def _create(self, conversation_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        """Start a new conversation in the cache; it reaches the database with its first append"""
+        now = now_us()
+        conversation = {
+            "id": conversation_id,
+            "user_id": user_id,
+            "messages": MessageLog(),
+            "created_at": now,
+            "updated_at": now
+        }
+        self._cache_put(conversation)
+        return conversation
+
+    def _compact(self, messages: MessageLog, pending: int):
+        """Compact a cached message log if it has outgrown the policy, keeping queued appends verbatim"""
+        if self.compactor is not None and self.compactor.should_compact(messages):
+            self.compactor.compact(messages, keep_recent=max(self.compactor.keep_recent, pending))
+
+    def _touch(self, conversation_id: str, entry: list):
+        """Mark a cached conversation as most recently used"""
+        entry[1] = time.monotonic()
+        self._cache.move_to_end(conversation_id)
+
+    def _cache_put(self, conversation: Dict[str, Any]):
+        """Cache a conversation, dropping least recently used ones without queued appends"""
+        self._cache[conversation["id"]] = [conversation, time.monotonic()]
+        self._cache.move_to_end(conversation["id"])
+        if len(self._cache) > self.max_cached:
+            for conversation_id in list(self._cache):
+                if len(self._cache) <= self.max_cached:
+                    break
+                if conversation_id not in self._pending:
+                    del self._cache[conversation_id]
+
+    def _call(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run an operation on the writer thread after every write queued before it"""
+        future: Future = Future()
+        self._queue.put(("call", (operation, future)))
+        return future.result()
+
+    async def _call_async(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Like ``_call``, awaiting the writer thread instead of blocking on it"""
+        future: Future = Future()
+        await self._put_async(("call", (operation, future)))
+        return await asyncio.wrap_future(future)
+
+    async def _put_async(self, write: tuple):
+        """Queue a write, waiting in a worker thread rather than on the event loop when the queue is full"""
+        if not self._put_lock.locked():
+            try:
+                self._queue.put_nowait(write)
+                return
+            except queue.Full:
+                pass
+        async with self._put_lock:
+            await asyncio.to_thread(self._queue.put, write)
+
+    def _check_writes(self, connection: sqlite3.Connection):
+        """Raise the error of appends dropped since the last check; runs on the writer thread"""
+        failure, self._write_failure = self._write_failure, None
+        if failure is not None:
+            raise failure
+
+    def _delete(self, connection: sqlite3.Connection, conversation_id: str) -> bool:
+        """Delete a conversation and its messages"""
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            deleted = connection.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+        return deleted > 0
+
+    def _write_loop(self):
+        """Group-commit queued appends and run queued operations, in arrival order"""
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and batch[-1][0] == "append":
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            appends = []
+            for kind, payload in batch:
+                if kind == "append":
+                    appends.append(payload)
+                    continue
+                self._commit_appends(connection, appends)
+                appends = []
+                operation, future = payload
+                try:
+                    future.set_result(operation(connection))
+                except Exception as e:
+                    future.set_exception(e)
+            self._commit_appends(connection, appends)
+
+    def _commit_appends(self, connection: sqlite3.Connection, appends: List[tuple]):
+        """Write a batch of appends in one transaction, retrying it before giving the appends up"""
+        if not appends:
+            return
+
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                self._write_appends(connection, appends)
+                return
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                if attempt == self.write_attempts:
+                    logger.error("Dropping %d conversation messages after %d failed writes: %s", len(appends), attempt, e)
+                    self.messages_dropped += len(appends)
+                    self._write_failure = e
+                    with self._lock:
+                        self._release(appends)
+                    return
+                logger.warning("Writing %d conversation messages failed (attempt %d of %d), retrying: %s",
+                               len(appends), attempt, self.write_attempts, e)
+                time.sleep(WRITE_RETRY_DELAY * attempt)
+
+    def _write_appends(self, connection: sqlite3.Connection, appends: List[tuple]):
+        """Write a batch of appends in one transaction, updating each conversation row once"""
+
+        conversations: Dict[str, list] = {}
+        for item in appends:
+            row = conversations.get(item[0])
+            if row is None:
+                conversations[item[0]] = [*item[:5], 1]
+            else:
+                row[3] = item[3]
+                row[5] += 1
+
+        connection.execute("BEGIN IMMEDIATE")
+        connection.executemany(UPSERT_CONVERSATION, conversations.values())
+        connection.executemany(INSERT_MESSAGE, [(item[0], item[5], item[6], item[3]) for item in appends])
+        with self._lock:
+            connection.execute("COMMIT")
+            self._release(appends)
+        self.commits += 1
+        self.messages_written += len(appends)
+
+    def _release(self, appends: List[tuple]):
+        """Drop committed (or failed) appends from the pending counts; caller holds the lock"""
+        for item in appends:
+            remaining = self._pending[item[0]] - 1
+            if remaining:
+                self._pending[item[0]] = remaining
+            else:
+                del self._pending[item[0]]
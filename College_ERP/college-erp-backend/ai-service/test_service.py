@@ -30,6 +30,23 @@ async def test_chatbot():
         response = await chatbot.generate_response(message, user_id="test_user")
         print(f"AI: {response['response'][:200]}...")
     
+    # Single generic words are answered by their intent, not by a loosely matching FAQ entry
+    for message in ["fees", "library", "what is the time"]:
+        response = await chatbot.generate_response(message, user_id="test_user")
+        assert response["confidence"] is None, f"FAQ answer overrode the intent for {message!r}"
+    
+    response = await chatbot.generate_response("How can I pay my semester fees online?", user_id="test_user")
+    assert response["confidence"] is not None and 0.0 <= response["confidence"] <= 1.0
+    
+    # Misspelled keywords are corrected, correctly spelled look-alike words are left alone
+    matcher = chatbot.knowledge_base.current.intent_matcher
+    for word, intent in [("admision", "admission"), ("libary", "library"), ("placment", "placement")]:
+        assert intent in matcher.match(word), f"{word!r} should resolve to {intent}"
+    for word in ["contract", "prone", "apple"]:
+        assert not matcher.match(word), f"{word!r} should not be corrected into a keyword"
+    assert "contact" not in matcher.match("can you explain my hostel contract")
+    assert "fees" not in matcher.match("how it feels")
+    
     print("\n✓ Chatbot tests completed successfully!")
 
 async def test_portfolio_generator():
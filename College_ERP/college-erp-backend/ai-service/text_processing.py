@@ -0,0 +1,39 @@
+import re
+from typing import List, Tuple
+
+# Words are runs of lowercase letters/digits; everything else is a separator
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Common English function words that carry no retrieval signal
+STOP_WORDS = frozenset("""
+a about am an and any are as at be been but by can could do does for from get got had has have
+how i if in into is it its me my of on or our please should so tell than that the their them then
+there these they this to us was we were what when where which who why will with would you your
+""".split())
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and collapse runs of whitespace"""
+    return " ".join(text.lower().split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def tokenize_with_spans(text: str) -> List[Tuple[str, int, int]]:
+    """Split text into lowercase word tokens along with their character spans"""
+    return [(match.group(), match.start(), match.end()) for match in TOKEN_PATTERN.finditer(text.lower())]
+
+
+def content_tokens(text: str) -> List[str]:
+    """Tokenize text and drop stop words"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def light_stem(token: str) -> str:
+    """Strip a plural "s" so that "timings" and "timing" index to the same term"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token